@@ -1,19 +1,24 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 
-import os
 import sys
-import pyzipper
 import threading
 import colorama
+from datetime import datetime
 from getpass import getpass
+import humanize
 from prettytable import PrettyTable
 from ..configs import config
+from ..zstd_utils import register_zstandard
+from ..chunk_store import ChunkStore, SNAPSHOT_EXTENSION
+from ..catalog import Catalog
+from ..restore_utils import parse_patterns, restore_backup
 from ..system_notifications import notify_user
 from colorama import Fore as F
 
 colorama.init(autoreset=True)
 config.load()
+register_zstandard()  # Zstandard backups can be restored
 
 
 class RestoreBackup:
@@ -26,17 +31,14 @@ class RestoreBackup:
         Extract selected zip file & move zip file content to it's original location.
         """
         table = PrettyTable()
-        table.field_names = ["ID", "Backups", "Type"]
+        table.field_names = ["ID", "Backups", "Type", "Files", "Size"]
 
-        # Iterate over the files in the destination path
-        for index, zip_file in enumerate(os.listdir(DESTINATION_PATH)):
-            filename, _, filetype = zip_file.partition('.')
-
-            # Check if it's a zip file
-            if filetype == 'zip':
-                backups_table[index] = filename
-                # Add file information to the table
-                table.add_row([index, filename, filetype])
+        # Iterate over the backups recorded in the catalog
+        with Catalog(DESTINATION_PATH) as catalog:
+            for index, (backup_file, filename, filetype, _, size, entries, _) in enumerate(catalog.list_backups()):
+                backups_table[index] = backup_file
+                # Add backup information to the table
+                table.add_row([index, filename, filetype, entries, humanize.naturalsize(size)])
 
         print(table)
 
@@ -47,23 +49,75 @@ class RestoreBackup:
             sys.exit()
 
         if selected_id.isdigit() and int(selected_id) in backups_table:
-            selected_filename = backups_table[int(selected_id)]
+            selected_filename, _, selected_filetype = backups_table[int(selected_id)].partition('.')
             file_name = f"{DESTINATION_PATH}{selected_filename}.zip"
+            patterns = self.get_restore_patterns()
+
+            if selected_filetype == SNAPSHOT_EXTENSION:
+                restored_files = ChunkStore(DESTINATION_PATH).restore(selected_filename, config['destination_path'], patterns, config['restore_mode'] == "Skip unchanged")
+                self.notify_restore(restored_files)
+                return
 
-            # Open the zipfile in read mode, extract its content
-            with pyzipper.AESZipFile(file=file_name, mode='r') as zipObj:
-                try:
-                    if config['encryption'] and (config['compression_method'] == "ZIP_DEFLATED" or config['compression_method'] == "ZIP_STORED"):
-                        zipObj.setpassword(self.get_backup_password())
-                    zipObj.extractall(config['destination_path'])
-                    notify_user(message="Files Restored Sucessfully.", terminal_color=F.LIGHTYELLOW_EX)
-                except (RuntimeError, TypeError):
-                    pass
+            # Extract only the matching entries, from the backup & the backups it is built on (incremental chain)
+            try:
+                password = None
+                if config['encryption'] and config['compression_method'] in ("ZIP_DEFLATED", "ZIP_STORED", "ZIP_ZSTANDARD"):
+                    password = self.get_backup_password()
+                restored_files = restore_backup(file_name, patterns, config['destination_path'], password,
+                                                config['restore_workers'], config['restore_mode'] == "Skip unchanged")
+                self.notify_restore(restored_files)
+            except FileNotFoundError as e:
+                notify_user(message=str(e), terminal_color=F.LIGHTRED_EX)
+            except (RuntimeError, TypeError):
+                pass
         else:
             notify_user(message="Invalid backup ID selected.", terminal_color=F.LIGHTRED_EX)
             sys.exit()
 
 
+    def search_file(self, DESTINATION_PATH):
+        """
+        Find the backups that contain a file (by full path or file name).
+        """
+        try:
+            path_or_filename = input("\nFile to search for (full path or file name): ").strip()
+        except KeyboardInterrupt:
+            print(f"\n{F.LIGHTCYAN_EX}* Exiting...")
+            sys.exit()
+
+        with Catalog(DESTINATION_PATH) as catalog:
+            results = catalog.find_file(path_or_filename)
+
+        if not results:
+            notify_user(message="File not found in any backup.", terminal_color=F.LIGHTRED_EX)
+            return
+
+        table = PrettyTable()
+        table.field_names = ["Backups", "Type", "Path", "Size", "Modified"]
+        for name, filetype, path, size, mtime in results:
+            table.add_row([name, filetype, path, humanize.naturalsize(size), datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M')])
+        print(table)
+
+
+    def get_restore_patterns(self):
+        """
+        Prompt the user for the files/folders to restore (e.g. /home/user/Documents, *.xlsx).
+        Return an empty list to restore everything.
+        """
+        try:
+            return parse_patterns(input("Files/folders to restore (comma separated, leave empty for all): "))
+        except KeyboardInterrupt:
+            print(f"\n{F.LIGHTCYAN_EX}* Exiting...")
+            sys.exit()
+
+
+    def notify_restore(self, restored_files):
+        if restored_files:
+            notify_user(message="Files Restored Sucessfully.", terminal_color=F.LIGHTYELLOW_EX)
+        else:
+            notify_user(message="No files in the backup match the given paths.", terminal_color=F.LIGHTRED_EX)
+
+
     def get_backup_password(self):
         """
         Prompt the user to enter password and return it as bytes.
@@ -2,18 +2,30 @@
 # -*- coding: UTF-8 -*-
 
 import os
+import time
 import pyzipper
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from pyzipper import BadZipFile
-from ..cloud_utils import GoogleDriveCloud, FTP, Dropbox
+from ..cloud_utils import GoogleDriveCloud, FTP, Dropbox, LocalDirectory
 from ..system_notifications import notify_user
-from ..file_utils import get_drive_usage_percentage, backup_expiry_date, last_backup
+from ..file_utils import get_drive_usage_percentage, backup_expiry_date, start_backup_expiry
+from ..chunk_store import ChunkStore, SNAPSHOT_EXTENSION
+from ..catalog import Catalog, get_snapshot_files
+from ..zip_utils import ParallelZipWriter, HashingFile, VolumeFile, verify_zip_file
+from ..volumes import remove_backup_files
+from ..upload_queue import UploadQueue
+from ..digests import PROVIDER_DIGEST_ALGORITHMS
+from ..zstd_utils import ZIP_ZSTANDARD
+from ..scanner import scan_source_paths, get_total_size
+from ..manifest import get_file_signature, get_parent_backup, get_parent_comment, load_manifest, save_manifest, DELETED_FILES_ENTRY
+from ..change_journal import apply_changes
 from ..configs import config
 import customtkinter as ctk
 
 google_drive = GoogleDriveCloud()
 ftp = FTP()
+local_directory = LocalDirectory()
 dropbox = Dropbox()
 
 class Backup:
@@ -21,52 +33,89 @@ class Backup:
     Handle the creation, compression, encryption, and storage of backups.
     """
 
+    change_journal = None  # Set by the automatic backups daemon while it watches the source paths
+
     def zip_files(self, App, SOURCE_PATHS, DESTINATION_PATH):
         """
         Zip (backup) source path files to destination path:
-            * Supported compression methods: ZIP_DEFLATED, ZIP_STORED, ZIP_LZMA, ZIP_BZIP2.
+            * Supported compression methods: ZIP_DEFLATED, ZIP_STORED, ZIP_LZMA, ZIP_BZIP2, ZIP_ZSTANDARD.
             * Enabled Zip64 (this parameter use the ZIP64 extensions when the zip file is larger than 4GiB).
             * Set compression level (1: fast ... 9: saves storage space).
+            * Read, compress & write files as a pipeline of concurrent stages (compression_workers, pipeline_memory_limit).
+            * Adaptive compression: store incompressible files (media, archives...) instead of compressing them.
+            * Backup modes: Full (every file), Incremental (only new or changed files since the last backup).
+            * Backup repositories: Zip (dated zip files), Chunk store (deduplicated chunks & snapshots).
+            * Split the zip file into volumes (volume_size), each one is queued for upload as soon as it's finished.
+            * Record the backup & its files in the catalog.
         """
         if get_drive_usage_percentage() <= 90:
-            if config['backup_expiry_date'] != "Forever":
-                backup_expiry_date(DESTINATION_PATH)
+            self.remove_expired_backups(DESTINATION_PATH, after_backup=False)
+
+            if config['backup_repository'] == "Chunk store":
+                self.write_to_chunk_store(SOURCE_PATHS, DESTINATION_PATH)
+                return
 
             try:
                 file_name = f"{DESTINATION_PATH}{date.today()}.zip"
+                archive_name = os.path.basename(file_name)
+                parent_backup = self.get_parent_backup(DESTINATION_PATH, archive_name)
+                incremental = parent_backup is not None
+                parent, previous_files, chain_started = parent_backup or (None, {}, time.time())
+                current_files = {}
                 compression_method = self.get_compression_method()
                 compression_level = config['compression_level']
-                if config['encryption'] and (config['compression_method'] == "ZIP_DEFLATED" or config['compression_method'] == "ZIP_STORED"):
+                if config['encryption'] and config['compression_method'] in ("ZIP_DEFLATED", "ZIP_STORED", "ZIP_ZSTANDARD"):
                     encryption = pyzipper.WZ_AES
                     self.password = self.get_backup_password()
                 else:
                     encryption = None
                     self.password = None
 
-                with pyzipper.AESZipFile(file=file_name, mode='w', compression=compression_method, encryption=encryption, allowZip64=True, compresslevel=int(compression_level)) as zipObj:
-                    try:
-                        zipObj.setpassword(self.password)
-                    except UnboundLocalError:
-                        pass
+                try:
+                    with self.open_archive_file(file_name, DESTINATION_PATH) as archive_file, \
+                        pyzipper.AESZipFile(file=archive_file, mode='w', compression=compression_method, encryption=encryption, allowZip64=True, compresslevel=int(compression_level)) as zipObj, \
+                        ParallelZipWriter(zipObj, config['compression_workers'], config['pipeline_memory_limit'], config['adaptive_compression'], self.get_compression_executor()) as writer:
+                        try:
+                            zipObj.setpassword(self.password)
+                        except UnboundLocalError:
+                            pass
 
-                    # Iterate over each path in the source list
-                    for item in SOURCE_PATHS:
-                        source_item_label = ctk.CTkLabel(master=App, text=item, height=20, font=('Helvetica', 12))
+                        source_item_label = ctk.CTkLabel(master=App, text="Scanning source paths...", height=20, font=('Helvetica', 12))
                         source_item_label.place(x=15, y=290)
 
-                        # Iterate over the files and folders in the path
-                        for root, dirs, files in os.walk(item):
-                            for dirname in dirs:
-                                dirpath = os.path.join(root, dirname)
-                                zipObj.write(dirpath)
+                        entries = self.get_changed_entries(SOURCE_PATHS, DESTINATION_PATH, incremental, previous_files, current_files)
+                        total_size, queued_size, last_progress = get_total_size(entries), 0, None
 
-                            for filename in files:
-                                filepath = os.path.join(root, filename)
-                                zipObj.write(filepath)
+                        for entry in entries:
+                            if not entry.is_dir:
+                                queued_size += entry.stat.st_size
+                            progress = int(queued_size * 100 / total_size) if total_size else 100
+                            if progress != last_progress:  # Don't redraw the label for every file
+                                source_item_label.configure(text=f"{progress}% - {entry.path}")
+                                last_progress = progress
+                            writer.write(entry.path, entry.stat)
                         source_item_label.place_forget()
 
-                self.check_zip_file(DESTINATION_PATH)
+                        if incremental:
+                            zipObj.comment = get_parent_comment(parent)  # Restores & retention follow the chain back to the full backup
+                            # Keep track of the files removed since the previous backup
+                            deleted_files = sorted(set(previous_files) - set(current_files))
+                            if deleted_files:
+                                writer.writestr(DELETED_FILES_ENTRY, "\n".join(deleted_files))
+
+                    with Catalog(DESTINATION_PATH) as catalog:
+                        catalog.add_backup(archive_name, config['compression_method'], [(entry.path, entry.stat.st_size, entry.stat.st_mtime) for entry in entries if not entry.is_dir], parent=parent)
+
+                    if self.check_zip_file(file_name, archive_file, zipObj.infolist()):
+                        # Only a verified backup becomes the baseline of the next incremental backup
+                        save_manifest(DESTINATION_PATH, archive_name, current_files, previous_files, parent, chain_started)
+                    elif self.change_journal:
+                        self.change_journal.mark_incomplete()  # The next backup compares against the previous manifest, scan every folder
+                except BaseException:
+                    self.discard_failed_backup(file_name, archive_name, DESTINATION_PATH)
+                    raise
                 self.upload_to_cloud(DESTINATION_PATH)
+                self.remove_expired_backups(DESTINATION_PATH, after_backup=True)
 
                 notify_user(
                     title="SafeArchive: Backup Completed",
@@ -89,6 +138,91 @@ class Backup:
             )
 
 
+    def discard_failed_backup(self, file_name, archive_name, DESTINATION_PATH):
+        """
+        Clean up after a backup that failed before its manifest was saved:
+        the change journal was already rotated, so the next backup scans every folder instead (the changes aren't lost),
+        & the partial zip file (or its volumes) is removed with its catalog record.
+        """
+        if self.change_journal:
+            self.change_journal.mark_incomplete()
+        remove_backup_files(file_name)
+        with Catalog(DESTINATION_PATH) as catalog:
+            catalog.remove_backups([archive_name])
+
+
+    def write_to_chunk_store(self, SOURCE_PATHS, DESTINATION_PATH):
+        """
+        Backup source path files to the chunk store (only new chunks are written) & upload to the cloud.
+        Chunks are stored without encryption, so the backup is refused if encryption is enabled.
+        """
+        if config['encryption']:
+            notify_user(
+                title='SafeArchive: [Error] The chunk store is not encrypted.',
+                message='Disable encryption or use the Zip backup repository to encrypt your backups.',
+                icon='error.ico'
+            )
+            return
+        snapshot, written_size = ChunkStore(DESTINATION_PATH).backup(SOURCE_PATHS, f"{date.today()}")
+        with Catalog(DESTINATION_PATH) as catalog:
+            catalog.add_backup(f"{date.today()}.{SNAPSHOT_EXTENSION}", "Chunk store", get_snapshot_files(snapshot), extra_size=written_size)
+        self.upload_to_cloud(DESTINATION_PATH)
+        self.remove_expired_backups(DESTINATION_PATH, after_backup=True)
+
+        notify_user(
+            title="SafeArchive: Backup Completed",
+            message=f"SafeArchive has finished the backup to '{DESTINATION_PATH.replace('SafeArchive/', '')}'.",
+            icon='backup_completed.ico'
+        )
+
+
+    def remove_expired_backups(self, DESTINATION_PATH, after_backup):
+        """
+        Remove the backups that the retention policy doesn't keep:
+        before the backup, or in the background once the new backup has finished (background_pruning).
+        """
+        if config['backup_expiry_date'] == "Forever" or after_backup != config['background_pruning']:
+            return
+        if after_backup:
+            start_backup_expiry(DESTINATION_PATH)
+        else:
+            backup_expiry_date(DESTINATION_PATH)
+
+
+    def get_parent_backup(self, DESTINATION_PATH, archive_name):
+        """
+        Return the backup the incremental backup is built on (archive name, its files, creation time of the chain's full backup).
+        Return None for a full backup: Full mode, no previous backup, or the chain is older than full_backup_interval days.
+        """
+        if config['backup_mode'] != "Incremental":
+            return None
+        return get_parent_backup(DESTINATION_PATH, archive_name, int(config['full_backup_interval']))
+
+
+    def get_changed_entries(self, SOURCE_PATHS, DESTINATION_PATH, incremental, previous_files, current_files):
+        """
+        Scan the source paths & record the current files (manifest).
+        Return the entries to write (only new or changed ones in incremental mode).
+        With a complete change journal, only the paths changed since the last backup are read instead of every folder.
+        """
+        changes = self.change_journal.rotate(SOURCE_PATHS) if self.change_journal else None
+        if incremental and changes is not None:
+            manifest = load_manifest(DESTINATION_PATH)
+            if manifest['archive'] is not None:
+                return apply_changes(manifest['files'], changes, previous_files, current_files)
+        return [entry for entry in scan_source_paths(SOURCE_PATHS) if not self.is_unchanged(entry, incremental, previous_files, current_files)]
+
+
+    def is_unchanged(self, entry, incremental, previous_files, current_files):
+        """
+        Record the scanned entry signature in the current manifest.
+        Return True if the entry is unchanged since the previous backup (incremental mode only).
+        """
+        signature = get_file_signature(entry.stat)
+        current_files[entry.path] = signature
+        return incremental and previous_files.get(entry.path) == signature
+
+
     def get_compression_method(self):
         """
         Retrieve the compression method specified in the configuration.
@@ -98,7 +232,8 @@ class Backup:
             "ZIP_STORED": pyzipper.ZIP_STORED,
             "ZIP_DEFLATED": pyzipper.ZIP_DEFLATED,
             "ZIP_BZIP2": pyzipper.ZIP_BZIP2,
-            "ZIP_LZMA": pyzipper.ZIP_LZMA
+            "ZIP_LZMA": pyzipper.ZIP_LZMA,
+            "ZIP_ZSTANDARD": ZIP_ZSTANDARD
         }
 
         compression_method_key = config['compression_method']
@@ -106,33 +241,101 @@ class Backup:
         return compression_method
 
 
-    def check_zip_file(self, DESTINATION_PATH):
+    def get_compression_executor(self):
+        """
+        Return the compressor workers, kept for the next backups of the process (e.g. scheduled backups).
+        """
+        workers = max(int(config['compression_workers']), 1)
+        if getattr(self, 'compression_workers', None) != workers:
+            if hasattr(self, 'compression_executor'):
+                self.compression_executor.shutdown(wait=False)
+            self.compression_executor = ThreadPoolExecutor(max_workers=workers)
+            self.compression_workers = workers
+        return self.compression_executor
+
+
+    def check_zip_file(self, file_name, archive_file, entries):
         """
         Check if the zip file is valid and not corrupted.
+        Only its size & central directory are checked (structural), verify_mode Deep also tests every entry's data.
+        Return True if the zip file is valid.
         """
-        filepath = os.path.join(DESTINATION_PATH, last_backup(DESTINATION_PATH))
-        try:
-            with pyzipper.AESZipFile(f"{filepath}.zip") as zf:
-                zf.setpassword(self.password)
-                zf.testzip()
-        except BadZipFile:
+        verified = verify_zip_file(file_name, archive_file, entries, self.password, config['verify_mode'] == "Deep")
+        if not verified:
             notify_user(
                 title='SafeArchive: [Error] Backup corrupted.',
                 message='The backup file is corrupted.',
                 icon='error.ico'
             )
+        return verified
+
+
+    def open_archive_file(self, file_name, DESTINATION_PATH):
+        """
+        Open the zip file output: a single zip file, or volumes of volume_size MB.
+        Finished volumes are queued for upload right away & uploaded while the next ones are written.
+        The digests the storage provider compares (e.g. MD5 for Google Drive) are computed while writing,
+        the SHA-256 only if the deep check (verify_mode Deep) compares it.
+        """
+        digest_algorithms = PROVIDER_DIGEST_ALGORITHMS.get(config['storage_provider'], [])
+        sha256 = config['verify_mode'] == "Deep"
+        if not config['volume_size']:
+            return HashingFile(file_name, digest_algorithms, sha256)
+        return VolumeFile(file_name, int(config['volume_size']) * 1024 * 1024,
+                          lambda volume_path: self.queue_upload(DESTINATION_PATH, os.path.basename(volume_path)), digest_algorithms, sha256)
 
 
     def upload_to_cloud(self, DESTINATION_PATH):
         """
-        Initialize & upload local backups to the cloud.
+        Queue a sync of the local backups to the cloud, the backup doesn't wait for the upload.
         """
-        if config['storage_provider'] == "Google Drive":
-            google_drive.backup_to_google_drive(DESTINATION_PATH)    
-        elif config['storage_provider'] == "FTP":
-            ftp.backup_to_ftp_server(DESTINATION_PATH)
-        elif config['storage_provider'] == "Dropbox":
-            dropbox.upload_to_dropbox(DESTINATION_PATH)
+        self.queue_upload(DESTINATION_PATH)
+
+
+    def queue_upload(self, DESTINATION_PATH, filename=None):
+        """
+        Add a backup file (or a sync of the destination path) to the upload queue, a background worker uploads it.
+        """
+        if config['storage_provider'] != "None":
+            self.start_upload_queue(DESTINATION_PATH).put(config['storage_provider'], "file" if filename else "sync", filename)
+
+
+    def start_upload_queue(self, DESTINATION_PATH):
+        """
+        Start the upload worker (the uploads left by a previous run are resumed).
+        Return the upload queue.
+        """
+        if not hasattr(self, 'upload_queue'):
+            self.upload_queue = UploadQueue(DESTINATION_PATH, lambda job: self.run_upload_job(DESTINATION_PATH, job))
+        self.upload_queue.start()
+        return self.upload_queue
+
+
+    def run_upload_job(self, DESTINATION_PATH, job):
+        """
+        Upload a queued backup file or sync the destination path with the job's storage provider.
+        Return the number of bytes uploaded.
+        """
+        if job['type'] == "file" and not os.path.exists(os.path.join(DESTINATION_PATH, job['filename'])):
+            return 0  # Removed since it was queued (e.g. expired)
+
+        if job['provider'] == "Google Drive":
+            if job['type'] == "file":
+                return google_drive.upload_backup_file(DESTINATION_PATH, job['filename'])
+            return google_drive.backup_to_google_drive(DESTINATION_PATH)
+        elif job['provider'] == "FTP":
+            if job['type'] == "file":
+                return ftp.upload_backup_file(DESTINATION_PATH, job['filename'])
+            return ftp.backup_to_ftp_server(DESTINATION_PATH)
+        elif job['provider'] == "Dropbox":
+            if job['type'] == "file":
+                return dropbox.upload_backup_file(DESTINATION_PATH, job['filename'])
+            return dropbox.upload_to_dropbox(DESTINATION_PATH)
+        elif job['provider'] == "Local directory":
+            if job['type'] == "file":
+                return local_directory.upload_backup_file(DESTINATION_PATH, job['filename'])
+            return local_directory.backup_to_local_directory(DESTINATION_PATH)
+        return 0
 
 
     def get_backup_password(self):
@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 
-import os
-import pyzipper
 import threading
 import tkinter as tk
 from ..system_notifications import notify_user
 from ..configs import config
+from ..zstd_utils import register_zstandard
+from ..chunk_store import ChunkStore
+from ..catalog import Catalog
+from ..volumes import backup_exists
+from ..restore_utils import parse_patterns, restore_backup
 import customtkinter as ctk
 
+register_zstandard()  # Zstandard backups can be restored
+
 
 class RestoreBackup:
     """
@@ -21,13 +26,14 @@ class RestoreBackup:
         self.create_restore_window()
         self.create_listbox()
         self.populate_listbox()
+        self.create_patterns_entry()
         self.create_restore_button()
 
 
     def create_restore_window(self):
         self.restore_window = tk.Toplevel(self.App)
         self.restore_window.title("Select backup to restore")
-        self.restore_window.geometry("410x245")
+        self.restore_window.geometry("410x280")
         self.restore_window.iconbitmap("assets/ICO/restore.ico") if config['platform'] == "Windows" else None
         self.restore_window.resizable(False, False)  # Disable minimize/maximize buttons
         self.restore_window.configure(background=self.get_listbox_background())
@@ -68,19 +74,27 @@ class RestoreBackup:
 
     def populate_listbox(self):
         """
-        Populate listbox with the zip file names from the DESTINATION_PATH directory.
+        Populate listbox with the backup names (zip files & chunk store snapshots) recorded in the catalog.
         """
-        for index, zip_file in enumerate(os.listdir(self.DESTINATION_PATH)):
-            filename, _, filetype = zip_file.partition('.')
-            if filetype == 'zip':
-                self.listbox.insert(index, filename)
+        with Catalog(self.DESTINATION_PATH) as catalog:
+            for index, backup in enumerate(catalog.list_backups()):
+                self.listbox.insert(index, backup[1])
         self.listbox.selection_set(0)  # Set the initial selection to the first item
 
 
+    def create_patterns_entry(self):
+        """
+        Entry for the files/folders to restore (comma separated patterns, empty for all).
+        """
+        self.patterns_entry = ctk.CTkEntry(
+            master=self.restore_window, width=250, placeholder_text="Files/folders to restore (empty for all)")
+        self.patterns_entry.place(x=75, y=163)
+
+
     def create_restore_button(self):
         self.App.restore_button = ctk.CTkButton(
             master=self.restore_window, text="Restore backup", command=self.run_restore_thread)
-        self.App.restore_button.place(x=95, y=163)
+        self.App.restore_button.place(x=135, y=203)
 
 
     def run_restore_thread(self):
@@ -95,25 +109,50 @@ class RestoreBackup:
         Extract selected zip file & move zip file content to it's original location.
         """
         self.disable_restore_button()
+        patterns = parse_patterns(self.patterns_entry.get())
         for item in self.listbox.curselection():
             file_name = f"{self.DESTINATION_PATH}{self.listbox.get(item)}.zip"
-            with pyzipper.AESZipFile(file=file_name) as zipObj:
-                try:
-                    if config['encryption'] and (config['compression_method'] == "ZIP_DEFLATED" or config['compression_method'] == "ZIP_STORED"):
-                        zipObj.setpassword(self.get_backup_password())
-                    zipObj.extractall(config['destination_path'])
-
-                    notify_user(
-                        title='SafeArchive: Files Restored Sucessfully',
-                        message='SafeArchive has finished the restore.',
-                        icon='restore.ico'
-                    )
-
-                except (RuntimeError, TypeError):
-                    pass
+            if not backup_exists(file_name):
+                self.restore_snapshot(self.listbox.get(item), patterns)
+                continue
+
+            try:
+                password = None
+                if config['encryption'] and config['compression_method'] in ("ZIP_DEFLATED", "ZIP_STORED", "ZIP_ZSTANDARD"):
+                    password = self.get_backup_password()
+                # Restore from the backup & the backups it is built on (incremental chain)
+                restore_backup(file_name, patterns, config['destination_path'], password,
+                               config['restore_workers'], config['restore_mode'] == "Skip unchanged")
+
+                notify_user(
+                    title='SafeArchive: Files Restored Sucessfully',
+                    message='SafeArchive has finished the restore.',
+                    icon='restore.ico'
+                )
+
+            except FileNotFoundError as e:
+                notify_user(
+                    title='SafeArchive: [Error] Backup chain incomplete',
+                    message=str(e),
+                    icon='restore.ico'
+                )
+            except (RuntimeError, TypeError):
+                pass
         self.enable_restore_button()
 
 
+    def restore_snapshot(self, snapshot_name, patterns):
+        """
+        Rebuild the (matching) files of a chunk store snapshot in their original location.
+        """
+        ChunkStore(self.DESTINATION_PATH).restore(snapshot_name, config['destination_path'], patterns, config['restore_mode'] == "Skip unchanged")
+        notify_user(
+            title='SafeArchive: Files Restored Sucessfully',
+            message='SafeArchive has finished the restore.',
+            icon='restore.ico'
+        )
+
+
     def get_backup_password(self):
         """
         Prompt the user to enter password and return it as bytes.
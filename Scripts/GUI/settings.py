@@ -94,7 +94,7 @@ class Settings:
 
     def create_storage_provider_combobox(self):
         storage_provider_combobox_var = ctk.StringVar(value=config['storage_provider'])
-        storage_provider_options = ["None", "Google Drive", "Dropbox", "FTP"]
+        storage_provider_options = ["None", "Google Drive", "Dropbox", "FTP", "Local directory"]
         storage_provider_combobox = ctk.CTkComboBox(
             master=self.frame,
             width=112,
@@ -113,7 +113,7 @@ class Settings:
 
     def create_compression_method_combobox(self):
         compression_method_combobox_var = ctk.StringVar(value=config['compression_method'])
-        compression_method_options = ["ZIP_DEFLATED", "ZIP_STORED", "ZIP_LZMA", "ZIP_BZIP2"]
+        compression_method_options = ["ZIP_DEFLATED", "ZIP_STORED", "ZIP_LZMA", "ZIP_BZIP2", "ZIP_ZSTANDARD"]
         compression_method_combobox = ctk.CTkComboBox(
             master=self.frame,
             width=130,
@@ -150,7 +150,7 @@ class Settings:
 
     def create_keep_my_backups_combobox(self):
         backup_expiry_date_combobox_var = ctk.StringVar(value=config['backup_expiry_date'])
-        backup_expiry_date_options = ["1 month", "3 months", "6 months", "9 months", "1 year", "Forever"]
+        backup_expiry_date_options = ["1 month", "3 months", "6 months", "9 months", "1 year", "Generational", "Forever"]
         backup_expiry_date_combobox = ctk.CTkComboBox(
             master=self.frame,
             width=130,
@@ -2,47 +2,185 @@
 # -*- coding: UTF-8 -*-
 
 """
-This script is designed for automatic backups in the background.
-While currently requiring user interaction in some cases,
-I'm actively working to minimize this need.
+This script runs automatic backups in the background (daemon mode), every backup_interval hours.
+It sleeps until the next backup is due & performs it without any user interaction.
 
 
 Encryption Enabled:
 ----
 
-If backup encryption is enabled in the configuration file,
-you will be prompted to set a password every time a backup is performed.
-(Work in progress to automate password management)
+If backup encryption is enabled in the configuration file, the password is read from the file set in
+backup_password_file (readable by your user only), it's never prompted.
 
 Google Drive Storage:
 ----
 
-If Google Drive is selected as the storage provider,
-an authorization window will be displayed every time a backup is performed.
-(Investigating alternative authentication methods)
+The Google Drive token is cached (gdrive_credentials.json) & refreshed automatically.
+Sign in once from the CLI version (backup now) before starting the daemon, it never opens the browser:
+if the token is revoked, the uploads fail with a notification (& are retried) until you sign in again from the CLI version.
+
+Warm state:
+----
+
+The daemon keeps its state between backups: the upload queue worker, the compressor workers
+& the storage provider sessions are created once, so each backup only costs the work that is actually new.
+With incremental backups, the source paths are watched (change_journal, Linux): a backup only reads the paths
+changed since the previous one. The first backup after the daemon starts scans every folder.
 
 To run backups continuously:
 ----
 
-This script is designed to run 24/7 in the background.
+This script is designed to run 24/7 in the background: python3 -m Scripts.automatic (from the program directory).
 Please refer to your operating system's documentation for instructions on configuring background execution of scripts.
 Common methods include using task schedulers or systemd services.
 For detailed setup instructions:
 https://github.com/KafetzisThomas/SafeArchive/blob/main/docs/automatic_backups.md
 """
 
-import schedule
+import os
+import sys
 import time
-from CLI.backup_utils import Backup
+import signal
+import threading
+from colorama import Fore as F
+from .CLI.backup_utils import Backup
+from .catalog import Catalog
+from .change_journal import ChangeJournal, ChangeWatcher
+from .cloud_utils import GOOGLE_DRIVE_CREDENTIALS_PATH, set_interactive_sign_in
+from .file_utils import create_destination_directory_path
+from .system_notifications import notify_user
 from .configs import config
+
 config.load()
 
-backup = Backup()
+MAX_SLEEP = 15 * 60  # Check the clock at least every 15 minutes (e.g. after the computer was suspended)
+
+
+def read_backup_password():
+    """
+    Read the backup password from backup_password_file, returning it as bytes (UTF-8).
+    Return None if the file isn't set or can't be read.
+    """
+    if not config['backup_password_file']:
+        return None
+    try:
+        if os.name == "posix" and os.stat(config['backup_password_file']).st_mode & 0o077:
+            notify_user(message="The backup password file can be read by other users (chmod 600 it).", terminal_color=F.LIGHTYELLOW_EX)
+        with open(config['backup_password_file'], 'r', encoding='utf-8') as file:
+            password = file.read().rstrip("\r\n")
+    except OSError:
+        return None
+    return bytes(password, 'utf-8') if password else None
+
+
+class ScheduledBackup(Backup):
+    """
+    Backup that runs without user interaction: the password comes from the stored secret instead of a prompt.
+    """
+
+    def __init__(self, password):
+        self.stored_password = password
+
+
+    def get_backup_password(self):
+        return self.stored_password
+
+
+class BackupDaemon:
+    """
+    Perform a backup every backup_interval hours, sleeping until the next one is due.
+    The first backup is due backup_interval hours after the last backup in the catalog (right away if it's overdue).
+    """
+
+    def __init__(self, SOURCE_PATHS, DESTINATION_PATH, interval, password=None):
+        self.SOURCE_PATHS = SOURCE_PATHS
+        self.DESTINATION_PATH = DESTINATION_PATH
+        self.interval = interval * 60 * 60
+        self.backup = ScheduledBackup(password)
+        self.stopped = threading.Event()
+        self.last_attempt = 0
+        self.watcher = None
+
+
+    def get_next_backup_time(self):
+        """
+        Return when the next backup is due (timestamp): backup_interval after the last backup, or after the last attempt if it failed.
+        """
+        with Catalog(self.DESTINATION_PATH) as catalog:
+            latest_backup = catalog.get_latest_backup()
+        last_backup_time = latest_backup[1] if latest_backup else 0
+        return max(last_backup_time, self.last_attempt) + self.interval
+
+
+    def start_watcher(self):
+        """
+        Watch the source paths for the change journal (incremental zip backups only).
+        The backups scan every folder if the source paths can't be watched.
+        """
+        if not (config['change_journal'] and config['backup_mode'] == "Incremental" and config['backup_repository'] == "Zip"):
+            return
+        journal = ChangeJournal(self.DESTINATION_PATH)
+        self.watcher = ChangeWatcher(self.SOURCE_PATHS, journal)
+        if self.watcher.start():
+            self.backup.change_journal = journal
+        else:
+            self.watcher = None
+            notify_user(message="The source paths can't be watched, every backup scans them (on Linux, raise fs.inotify.max_user_watches).", terminal_color=F.LIGHTYELLOW_EX)
+
+
+    def run(self):
+        """
+        Run the scheduled backups until the daemon is stopped.
+        """
+        self.backup.start_upload_queue(self.DESTINATION_PATH)  # Resume the uploads left by a previous run
+        self.start_watcher()
+        while not self.stopped.is_set():
+            delay = self.get_next_backup_time() - time.time()
+            if delay > 0:
+                print(f"[!] Next backup in {delay / 60:.0f} minutes")
+                self.stopped.wait(min(delay, MAX_SLEEP))
+                continue
+
+            self.last_attempt = time.time()
+            try:
+                self.backup.zip_files(self.SOURCE_PATHS, self.DESTINATION_PATH)
+            except Exception as e:  # Keep the daemon running, the backup is retried after the next interval
+                notify_user(message=f"Automatic backup failed: {e}", terminal_color=F.LIGHTRED_EX)
+        if self.watcher:
+            self.watcher.stop()
+
+
+    def stop(self, *args):
+        """
+        Stop the daemon once the running backup (if any) has finished.
+        Queued uploads stay in the upload queue & resume on the next start.
+        """
+        self.stopped.set()
+
+
+if __name__ == "__main__":
+    if not config['backup_interval']:
+        notify_user(message="Automatic backups are disabled, set backup_interval (hours) in settings.json.", terminal_color=F.LIGHTRED_EX)
+        sys.exit()
 
-DESTINATION_PATH = config['destination_path'] + "SafeArchive/"  # Get value from the JSON file
+    password = None
+    if config['encryption'] and config['backup_repository'] == "Zip":
+        password = read_backup_password()
+        if password is None:
+            notify_user(message="Encryption is enabled, set backup_password_file to a file holding the backup password.", terminal_color=F.LIGHTRED_EX)
+            sys.exit()
 
-schedule.every(config['backup_interval']).hours.do(backup.perform_backup, DESTINATION_PATH)
+    if config['storage_provider'] == "Google Drive" and not os.path.exists(GOOGLE_DRIVE_CREDENTIALS_PATH):
+        notify_user(message="Sign in to Google Drive once from the CLI version before starting automatic backups.", terminal_color=F.LIGHTRED_EX)
+        sys.exit()
 
-while True:
-    schedule.run_pending()
-    time.sleep(1)
+    set_interactive_sign_in(False)  # Nobody can complete a browser sign-in in the background
+    DESTINATION_PATH = config['destination_path'] + "SafeArchive/"  # Get value from the JSON file
+    create_destination_directory_path(DESTINATION_PATH)
+    daemon = BackupDaemon(config['source_paths'], DESTINATION_PATH, float(config['backup_interval']), password)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
+    notify_user(message="Automatic backups stopped.", terminal_color=F.LIGHTCYAN_EX)
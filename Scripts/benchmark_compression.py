@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file benchmarks the supported compression methods on a sample tree.
+Usage: python3 -m Scripts.benchmark_compression <source path> [<source path> ...]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import pyzipper
+from prettytable import PrettyTable
+from .scanner import scan_source_paths, get_total_size
+from .zip_utils import ParallelZipWriter
+from .zstd_utils import ZIP_ZSTANDARD
+from .configs import config
+
+COMPRESSION_METHODS = {
+    "ZIP_STORED": pyzipper.ZIP_STORED,
+    "ZIP_DEFLATED": pyzipper.ZIP_DEFLATED,
+    "ZIP_BZIP2": pyzipper.ZIP_BZIP2,
+    "ZIP_LZMA": pyzipper.ZIP_LZMA,
+    "ZIP_ZSTANDARD": ZIP_ZSTANDARD
+}
+
+
+def benchmark(SOURCE_PATHS, compression_method, compression_level):
+    """
+    Zip the source paths with a compression method.
+    Return the zip file size, the time to write it & the time to read it back.
+    """
+    entries = scan_source_paths(SOURCE_PATHS)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_name = os.path.join(temp_dir, "benchmark.zip")
+
+        start = time.time()
+        with pyzipper.AESZipFile(file=file_name, mode='w', compression=compression_method, allowZip64=True, compresslevel=compression_level) as zipObj, \
+                ParallelZipWriter(zipObj, config['compression_workers'], config['pipeline_memory_limit']) as writer:
+            for entry in entries:
+                writer.write(entry.path, entry.stat)
+        write_time = time.time() - start
+
+        start = time.time()
+        with pyzipper.AESZipFile(file=file_name) as zipObj:
+            zipObj.testzip()
+        read_time = time.time() - start
+        return os.path.getsize(file_name), write_time, read_time
+
+
+if __name__ == "__main__":
+    SOURCE_PATHS = sys.argv[1:]
+    compression_level = int(config['compression_level'])
+    total_size = get_total_size(scan_source_paths(SOURCE_PATHS))
+
+    table = PrettyTable()
+    table.field_names = ["Method", "Size (MB)", "Ratio", "Write (MB/s)", "Read (MB/s)"]
+    for name, compression_method in COMPRESSION_METHODS.items():
+        size, write_time, read_time = benchmark(SOURCE_PATHS, compression_method, compression_level)
+        table.add_row([
+            name,
+            f"{size / 1024**2:.1f}",
+            f"{total_size / size:.2f}",
+            f"{total_size / 1024**2 / write_time:.1f}",
+            f"{total_size / 1024**2 / read_time:.1f}"
+        ])
+
+    print(f"Sample tree: {total_size / 1024**2:.1f} MB, compression level: {compression_level}, workers: {config['compression_workers']}")
+    print(table)
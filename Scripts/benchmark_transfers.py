@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file benchmarks the transfer engine offline, with the local directory storage provider.
+Every upload is delayed by a simulated network latency, so the effect of concurrent transfers shows on a local drive.
+Usage: python3 -m Scripts.benchmark_transfers [<file count> [<file size MB> [<latency ms>]]]
+"""
+
+import os
+import sys
+import time
+import filecmp
+import tempfile
+from prettytable import PrettyTable
+from .cloud_utils import LocalDirectory
+from .transfer_engine import TransferEngine, list_local_files
+
+TRANSFER_LIMITS = [1, 2, 4, 8, 16]
+
+
+class SlowDirectory(LocalDirectory):
+    """
+    Local directory storage provider with a fixed delay per upload (simulated network latency).
+    """
+
+    def __init__(self, directory_path, latency):
+        super().__init__(directory_path)
+        self.latency = latency
+
+
+    def upload_file(self, DESTINATION_PATH, relative_path, remote_file, offset):
+        time.sleep(self.latency)
+        return super().upload_file(DESTINATION_PATH, relative_path, remote_file, offset)
+
+
+def create_sample_files(DESTINATION_PATH, file_count, file_size):
+    for number in range(file_count):
+        with open(os.path.join(DESTINATION_PATH, f"sample-{number:04d}.bin"), 'wb') as file:
+            file.write(os.urandom(file_size))
+
+
+def is_synced(DESTINATION_PATH, remote_path):
+    """
+    Check that the remote directory holds the same files as the destination path, with the same content.
+    """
+    local_files = sorted(list_local_files(DESTINATION_PATH))
+    if local_files != sorted(list_local_files(remote_path)):
+        return False
+    _, mismatch, errors = filecmp.cmpfiles(DESTINATION_PATH, remote_path, local_files, shallow=False)
+    return not mismatch and not errors
+
+
+def benchmark(DESTINATION_PATH, limit, latency):
+    """
+    Sync the destination path to an empty directory, then sync it again (nothing to upload).
+    Return the engine after the first sync, the time of the second sync & whether the copy is correct.
+    """
+    with tempfile.TemporaryDirectory() as remote_dir:
+        provider = SlowDirectory(remote_dir, latency)
+        engine = TransferEngine(provider, limit)
+        engine.sync(DESTINATION_PATH)
+        synced = is_synced(DESTINATION_PATH, provider.remote_path)
+
+        start = time.time()
+        synced = TransferEngine(provider, limit).sync(DESTINATION_PATH) == 0 and synced
+        return engine, time.time() - start, synced
+
+
+if __name__ == "__main__":
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    file_size = int(float(sys.argv[2]) * 1024**2) if len(sys.argv) > 2 else 4 * 1024**2
+    latency = int(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.1
+
+    table = PrettyTable()
+    table.field_names = ["Transfers", "Files", "Upload (MB/s)", "Resync (s)", "Correct"]
+    with tempfile.TemporaryDirectory() as DESTINATION_PATH:
+        create_sample_files(DESTINATION_PATH, file_count, file_size)
+        for limit in TRANSFER_LIMITS:
+            engine, resync_time, synced = benchmark(DESTINATION_PATH, limit, latency)
+            table.add_row([
+                limit,
+                engine.uploaded_files,
+                f"{engine.uploaded_bytes / 1024**2 / engine.elapsed_time:.1f}",
+                f"{resync_time:.2f}",
+                "yes" if synced else "NO"
+            ])
+
+    print(f"Sample files: {file_count} x {file_size / 1024**2:.1f} MB, simulated latency: {latency * 1000:.0f} ms per upload")
+    print(table)
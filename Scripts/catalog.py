@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file keeps a catalog (SQLite database) of the backups in the destination path.
+It records each backup's time, size, entry count, compression method & files,
+so listing backups, searching for files & size reporting don't need to open or stat any archive.
+A size ledger keeps the total size of the destination path up to date as backups are added & removed,
+a background reconcile pass (file_utils.reconcile_backup_size) corrects any drift.
+"""
+
+import os
+import time
+import sqlite3
+from pyzipper import BadZipFile
+from .chunk_store import ChunkStore, SNAPSHOT_EXTENSION
+from .volumes import get_backup_filename, get_backup_files, get_backup_file_size, open_backup
+from .manifest import read_parent_comment
+
+CATALOG_FILENAME = ".catalog.db"
+
+
+def get_snapshot_files(snapshot):
+    """
+    Return the files (path, size, modification time) of a chunk store snapshot.
+    """
+    return [(path, file['signature'][0], file['signature'][1] / 1e9) for path, file in snapshot['files'].items()]
+
+
+class Catalog:
+    """
+    Record & query the backups in the destination path.
+    """
+
+    def __init__(self, DESTINATION_PATH):
+        self.DESTINATION_PATH = DESTINATION_PATH
+        catalog_path = os.path.join(DESTINATION_PATH, CATALOG_FILENAME)
+        is_new_catalog = not os.path.exists(catalog_path)
+
+        self.connection = sqlite3.connect(catalog_path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS backups (
+                filename TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                type TEXT NOT NULL,
+                created REAL NOT NULL,
+                size INTEGER NOT NULL,
+                entries INTEGER NOT NULL,
+                compression_method TEXT,
+                parent TEXT
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                backup TEXT NOT NULL REFERENCES backups(filename) ON DELETE CASCADE,
+                path TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ledger (
+                name TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                version INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO ledger SELECT 'destination', COALESCE(SUM(size), 0), 0 FROM backups;
+            CREATE INDEX IF NOT EXISTS backups_created ON backups(created);
+            CREATE INDEX IF NOT EXISTS files_backup ON files(backup);
+            CREATE INDEX IF NOT EXISTS files_path ON files(path);
+            CREATE INDEX IF NOT EXISTS files_filename ON files(filename);
+        """)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if "parent" not in [column[1] for column in self.connection.execute("PRAGMA table_info(backups)")]:
+            self.connection.execute("ALTER TABLE backups ADD COLUMN parent TEXT")  # Catalogs created before backup chains were recorded
+
+        if is_new_catalog:
+            self.import_existing_backups()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.close()
+
+
+    def add_backup(self, filename, compression_method, files, extra_size=0, parent=None):
+        """
+        Record a backup & its files (path, size, modification time).
+        A backup with the same filename (e.g. second backup of the day) is replaced.
+        The backup size is the size of the backup file (or of its volumes) plus extra_size (e.g. new chunks of a snapshot).
+        parent: the backup an incremental backup is built on.
+        """
+        filepath = os.path.join(self.DESTINATION_PATH, filename)
+        stat = os.stat(get_backup_files(filepath)[-1])
+        size = get_backup_file_size(filepath) + extra_size
+        name, _, filetype = filename.partition('.')
+
+        with self.connection:
+            self.update_ledger(size - self.get_backup_size(filename))
+            self.connection.execute("DELETE FROM backups WHERE filename = ?", (filename,))
+            self.connection.execute(
+                "INSERT INTO backups VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (filename, name, filetype, stat.st_mtime, size, len(files), compression_method, parent)
+            )
+            self.connection.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                ((filename, path, os.path.basename(path), file_size, mtime) for path, file_size, mtime in files)
+            )
+
+
+    def remove_backups(self, filenames):
+        """
+        Remove backups (e.g. expired ones) from the catalog in one transaction.
+        """
+        with self.connection:
+            self.update_ledger(-sum(self.get_backup_size(filename) for filename in filenames))
+            self.connection.executemany("DELETE FROM backups WHERE filename = ?", ((filename,) for filename in filenames))
+
+
+    def get_backup_size(self, filename):
+        row = self.connection.execute("SELECT size FROM backups WHERE filename = ?", (filename,)).fetchone()
+        return row[0] if row else 0
+
+
+    def update_ledger(self, size_difference):
+        self.connection.execute(
+            "UPDATE ledger SET size = size + ?, version = version + 1 WHERE name = 'destination'", (size_difference,))
+
+
+    def get_ledger_version(self):
+        return self.connection.execute("SELECT version FROM ledger WHERE name = 'destination'").fetchone()[0]
+
+
+    def reconcile_size(self, total_size, version):
+        """
+        Set the ledger to the measured size of the destination path,
+        unless a backup was added or removed since the measurement started (version changed).
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "UPDATE ledger SET size = ?, version = version + 1 WHERE name = 'destination' AND version = ?", (total_size, version))
+        return cursor.rowcount == 1
+
+
+    def list_backups(self):
+        """
+        Return the backups (filename, name, type, created, size, entries, compression method), oldest first.
+        """
+        return self.connection.execute(
+            "SELECT filename, name, type, created, size, entries, compression_method FROM backups ORDER BY created").fetchall()
+
+
+    def get_backup_parents(self):
+        """
+        Return the parent of each backup (filename -> parent filename, None for full backups & snapshots).
+        """
+        return dict(self.connection.execute("SELECT filename, parent FROM backups").fetchall())
+
+
+    def get_latest_backup(self):
+        """
+        Return the name & creation time of the most recent backup (None if there are no backups).
+        """
+        return self.connection.execute("SELECT name, created FROM backups ORDER BY created DESC LIMIT 1").fetchone()
+
+
+    def get_total_size(self):
+        """
+        Return the size of the destination path (backups, chunks & metadata files) from the ledger.
+        """
+        return self.connection.execute("SELECT size FROM ledger WHERE name = 'destination'").fetchone()[0]
+
+
+    def find_file(self, path_or_filename):
+        """
+        Return the backups that contain a file (searched by full path or by file name), newest first.
+        """
+        return self.connection.execute("""
+            SELECT backups.name, backups.type, files.path, files.size, files.mtime FROM files
+            JOIN backups ON backups.filename = files.backup
+            WHERE files.path = ? OR files.filename = ?
+            ORDER BY backups.created DESC
+        """, (path_or_filename, path_or_filename)).fetchall()
+
+
+    def import_existing_backups(self):
+        """
+        Record the backups made before the catalog existed.
+        """
+        for filename in os.listdir(self.DESTINATION_PATH):
+            if filename.endswith('.zip.001'):  # First volume of a split backup
+                filename = get_backup_filename(filename)
+            filepath = os.path.join(self.DESTINATION_PATH, filename)
+            name, _, filetype = filename.partition('.')
+            try:
+                if filetype == 'zip':
+                    with open_backup(filepath) as zipObj:
+                        files = [('/' + zinfo.filename, zinfo.file_size, time.mktime(zinfo.date_time + (0, 0, -1)))
+                                 for zinfo in zipObj.infolist() if not zinfo.is_dir()]
+                        parent = read_parent_comment(zipObj.comment)
+                    self.add_backup(filename, None, files, parent=parent)
+                elif filetype == SNAPSHOT_EXTENSION:
+                    snapshot = ChunkStore(self.DESTINATION_PATH).load_snapshot(name)
+                    self.add_backup(filename, "Chunk store", get_snapshot_files(snapshot))
+            except (BadZipFile, ValueError, OSError):
+                continue
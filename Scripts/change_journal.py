@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file keeps a change journal of the source paths (.change_journal.txt in the destination path),
+so incremental automatic backups only read the paths changed since the last backup instead of scanning every folder.
+A watcher (inotify, Linux) records the created, modified, deleted & renamed paths while the backup daemon runs.
+The journal is complete only if it was watched since the last backup without losing events:
+the backup falls back to a full scan if the watcher wasn't running yet or the journal overflowed.
+"""
+
+import os
+import sys
+import json
+import stat
+import time
+import errno
+import bisect
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from .scanner import ScanEntry, scan_tree
+from .manifest import get_file_signature
+
+JOURNAL_FILENAME = ".change_journal.txt"
+MAX_JOURNAL_ENTRIES = 100000  # A full scan is cheaper than applying more changes
+READ_SIZE = 64 * 1024
+
+# inotify(7) events & flags
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len (followed by the name)
+
+
+class ChangeJournal:
+    """
+    On-disk journal of the paths changed since the last backup: a header line, then one [path, tree] JSON list per line.
+    Tree paths are folders created, moved or deleted as a whole, the other paths only need to be read again (stat).
+    Every backup rotates it: the paths recorded so far are returned & a new journal is started.
+    """
+
+    def __init__(self, DESTINATION_PATH):
+        self.journal_path = os.path.join(DESTINATION_PATH, JOURNAL_FILENAME)
+        self.lock = threading.Lock()
+        self.recorded_paths = set()
+        self.watching = False
+        self.complete = False  # Nothing was watched before the first backup
+        self.start_journal([])
+
+
+    def start_journal(self, SOURCE_PATHS):
+        with open(f"{self.journal_path}.tmp", 'w', encoding='utf-8') as file:
+            file.write(json.dumps({"source_paths": SOURCE_PATHS, "started": time.time()}) + "\n")
+        os.replace(f"{self.journal_path}.tmp", self.journal_path)
+        self.file = open(self.journal_path, 'a', encoding='utf-8')
+        self.recorded_paths = set()
+
+
+    def record(self, changes):
+        """
+        Append changed paths ([path, tree] lists) to the journal, each one is recorded once per backup.
+        """
+        with self.lock:
+            if not self.complete:
+                return
+            new_changes = [change for change in changes if tuple(change) not in self.recorded_paths]
+            self.recorded_paths.update(tuple(change) for change in new_changes)
+            self.file.write("".join(json.dumps(change) + "\n" for change in new_changes))
+            self.file.flush()
+            if len(self.recorded_paths) > MAX_JOURNAL_ENTRIES:
+                self.complete = False
+
+
+    def set_watching(self, watching):
+        """
+        Record whether a watcher feeds the journal, the journal of the next backup is complete only while it does.
+        """
+        with self.lock:
+            self.watching = watching
+            self.complete = self.complete and watching
+
+
+    def mark_incomplete(self):
+        """
+        Events were lost (e.g. inotify queue overflow): the next backup scans the source paths.
+        """
+        with self.lock:
+            self.complete = False
+
+
+    def rotate(self, SOURCE_PATHS):
+        """
+        Start a new journal for the next backup.
+        Return the paths changed since the last backup (path -> tree), or None if the journal is incomplete (full scan needed).
+        """
+        with self.lock:
+            self.file.close()
+            changes = {}
+            with open(self.journal_path, 'r', encoding='utf-8') as file:
+                header = json.loads(file.readline())
+                for line in file:
+                    path, tree = json.loads(line)
+                    changes[path] = changes.get(path, False) or tree
+            complete = self.complete and header['source_paths'] == SOURCE_PATHS
+            self.start_journal(SOURCE_PATHS)
+            self.complete = self.watching
+        return changes if complete else None
+
+
+class ChangeWatcher:
+    """
+    Watch the folders of the source paths with inotify (Linux) & record every change in the change journal.
+    Each folder has its own watch, new folders are watched as soon as they are created or moved in.
+    """
+
+    def __init__(self, SOURCE_PATHS, journal):
+        self.SOURCE_PATHS = SOURCE_PATHS
+        self.journal = journal
+        self.watches = {}  # Watch descriptor -> folder path (as the scanner builds it)
+        self.fd = None
+        self.thread = None
+
+
+    def start(self):
+        """
+        Watch the source paths in the background.
+        Return False if inotify isn't available (other platforms) or the folders can't all be watched.
+        """
+        if not sys.platform.startswith("linux"):
+            return False
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            return False
+
+        try:
+            for path in self.SOURCE_PATHS:
+                self.add_watches(path)
+        except OSError:  # E.g. fs.inotify.max_user_watches reached
+            self.stop()
+            return False
+        self.stop_read, self.stop_write = os.pipe()
+        self.journal.set_watching(True)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return True
+
+
+    def add_watches(self, path):
+        """
+        Watch a folder & its subfolders (symbolic links to folders aren't followed, like the scanner).
+        Folders that vanished meanwhile are skipped.
+        """
+        folders = [path]
+        while folders:
+            folder = folders.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue
+                raise OSError(error, os.strerror(error), folder)
+            self.watches[wd] = folder
+            try:
+                with os.scandir(folder) as entries:
+                    folders.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+
+
+    def run(self):
+        while True:
+            readable, _, _ = select.select([self.fd, self.stop_read], [], [])
+            if self.stop_read in readable:
+                break
+            try:
+                self.read_events(os.read(self.fd, READ_SIZE))
+            except OSError:
+                break
+        self.journal.set_watching(False)
+
+
+    def read_events(self, data):
+        changes = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                self.journal.mark_incomplete()
+                continue
+            folder = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if folder is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if folder in self.SOURCE_PATHS:
+                    self.journal.mark_incomplete()  # A source path itself was removed or moved away
+                continue
+
+            path = os.path.join(folder, name)
+            tree_changed = bool(mask & IN_ISDIR and mask & (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO))
+            changes.append([path, tree_changed])
+            if mask & (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO) and folder not in self.SOURCE_PATHS:
+                changes.append([folder, False])  # Its modification time changed
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self.add_watches(path)  # A moved folder keeps its watches, they get the new path
+                except OSError:
+                    self.journal.mark_incomplete()
+        self.journal.record(changes)
+
+
+    def stop(self):
+        if self.thread:
+            os.write(self.stop_write, b"\0")
+            self.thread.join()
+            os.close(self.stop_read)
+            os.close(self.stop_write)
+            self.thread = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.journal.set_watching(False)
+
+
+def stat_entry(path):
+    """
+    Return the scan entry of a path (None if it doesn't exist anymore), like the scanner.
+    """
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return ScanEntry(path, stat.S_ISDIR(stat_result.st_mode), stat_result)
+
+
+def apply_changes(last_files, changes, previous_files, current_files):
+    """
+    Rebuild the current files (path -> signature) from the files of the last backup & the paths changed since (path -> tree).
+    Only the changed paths are read, tree paths (e.g. a folder moved in) are scanned as a whole.
+    Return the entries to write: the files that differ from the previous files.
+    """
+    current_files.update(last_files)
+    sorted_paths = sorted(last_files)
+    scanned_entries = {}
+    for path, tree in sorted(changes.items()):
+        entry = stat_entry(path)
+        current_files.pop(path, None)
+        if entry is None or tree:
+            # Forget what was inside the folder, what still exists is scanned again
+            prefix = os.path.join(path, '')
+            start = bisect.bisect_left(sorted_paths, prefix)
+            end = bisect.bisect_left(sorted_paths, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+            for index in range(start, end):
+                current_files.pop(sorted_paths[index], None)
+        if entry is None:
+            continue
+
+        scanned_entries[path] = entry
+        if tree and entry.is_dir and not os.path.islink(path):
+            scanned_entries.update((child.path, child) for child in scan_tree(path))
+
+    for entry in scanned_entries.values():
+        current_files[entry.path] = get_file_signature(entry.stat)
+
+    entries = []
+    for path, signature in list(current_files.items()):
+        if previous_files.get(path) == signature:
+            continue
+        entry = scanned_entries.get(path) or stat_entry(path)  # Changed before the last backup (same day backup)
+        if entry is None:
+            del current_files[path]
+            continue
+        current_files[path] = get_file_signature(entry.stat)
+        entries.append(entry)
+    return entries
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file provides a content-addressed chunk store (repository backend) for backups.
+Files are split into content-defined chunks, every unique chunk is stored once (deduplication)
+and each backup is recorded as a small snapshot index (YYYY-MM-DD.snapshot) next to the chunks.
+Storage only grows with the data that actually changed between backups.
+Chunk boundaries are found block by block with numpy if it's installed (optional, much faster), otherwise byte by byte.
+"""
+
+import os
+import json
+import zlib
+import hashlib
+try:
+    import numpy as np
+except ImportError:  # Optional, boundaries are then found byte by byte (same boundaries)
+    np = None
+from .scanner import scan_source_paths
+from .manifest import get_file_signature
+from .restore_utils import matches_patterns
+from .configs import config
+
+SNAPSHOT_EXTENSION = "snapshot"
+CHUNKS_DIRECTORY = "chunks"
+
+# Content-defined chunking parameters (chunk boundaries are found with a gear rolling hash)
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+BOUNDARY_BITS = 20
+BOUNDARY_MASK = (1 << BOUNDARY_BITS) - 1  # Average chunk size: ~1 MiB
+SCAN_SIZE = 512 * 1024  # Boundaries are searched block by block, most chunks end long before MAX_CHUNK_SIZE
+READ_SIZE = 8 * 1024 * 1024
+GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big') for i in range(256)]
+GEAR_BITS = np.array([(value & BOUNDARY_MASK) << (32 - BOUNDARY_BITS) for value in GEAR], dtype=np.uint32) if np else None  # Boundary bits on top
+
+
+def combine_hashes(newer_hashes, older_hashes, offset):
+    """
+    Add the hashes of the bytes offset positions earlier (shifted left by offset bits) to the hashes of the newer bytes.
+    The bits shifted out are above the boundary bits, so they aren't needed.
+    """
+    hashes = newer_hashes.copy()
+    hashes[offset:] += older_hashes[:-offset] << offset
+    return hashes
+
+
+def get_boundary_hashes(gears):
+    """
+    Return the boundary bits of the gear hash at every position of a block: sum of gears[i - k] << k over the last BOUNDARY_BITS bytes.
+    Windows of 1, 2, 4, 8... bytes are built by doubling & combined, so the block is read a few times instead of once per bit.
+    """
+    hashes, window = None, 0
+    window_hashes, window_size = gears, 1
+    bits = BOUNDARY_BITS
+    while True:
+        if bits & 1:
+            hashes = window_hashes if hashes is None else combine_hashes(hashes, window_hashes, window)
+            window += window_size
+        bits >>= 1
+        if not bits:
+            return hashes
+        window_hashes = combine_hashes(window_hashes, window_hashes, window_size)
+        window_size *= 2
+
+
+def find_chunk_boundary(buffer):
+    """
+    Return the length of the next chunk in the buffer.
+    The gear hash is shifted one bit per byte, so the bits tested for a boundary (the low BOUNDARY_BITS bits of the hash)
+    only depend on the last BOUNDARY_BITS bytes: with numpy, they are computed for a whole block at once
+    (kept in the top bits of 32-bit integers, so the bits of older bytes are shifted out), instead of one byte at a time.
+    """
+    length = min(len(buffer), MAX_CHUNK_SIZE)
+    if length <= MIN_CHUNK_SIZE:
+        return length
+    if np is None:
+        return scan_chunk_boundary(buffer, length)
+
+    # The first bytes of a chunk can't be a boundary, so skip hashing them
+    for start in range(MIN_CHUNK_SIZE, length, SCAN_SIZE):
+        end = min(start + SCAN_SIZE, length)
+        context = min(start - MIN_CHUNK_SIZE, BOUNDARY_BITS - 1)  # Bytes before the block that are still in the hash
+        gears = GEAR_BITS.take(np.frombuffer(buffer, dtype=np.uint8, count=end - start + context, offset=start - context))
+        boundaries = np.flatnonzero(get_boundary_hashes(gears)[context:] == 0)
+        if len(boundaries):
+            return start + int(boundaries[0]) + 1
+    return length
+
+
+def scan_chunk_boundary(buffer, length):
+    """
+    Return the length of the next chunk in the buffer (length bytes at most), hashing one byte at a time (without numpy).
+    """
+    # The first bytes of a chunk can't be a boundary, so skip hashing them
+    rolling_hash = 0
+    for index, byte in enumerate(buffer[MIN_CHUNK_SIZE:length], start=MIN_CHUNK_SIZE):
+        rolling_hash = ((rolling_hash << 1) + GEAR[byte]) & BOUNDARY_MASK  # Higher bits never reach the boundary bits
+        if not rolling_hash:
+            return index + 1
+    return length
+
+
+def iter_chunks(file):
+    """
+    Read a file object & yield its content-defined chunks.
+    """
+    buffer = b""
+    end_of_file = False
+    while not end_of_file:
+        data = file.read(READ_SIZE)
+        end_of_file = not data
+        buffer += data
+        while len(buffer) >= MAX_CHUNK_SIZE or (end_of_file and buffer):
+            boundary = find_chunk_boundary(buffer)
+            yield buffer[:boundary]
+            buffer = buffer[boundary:]
+
+
+class ChunkStore:
+    """
+    Store backups as deduplicated chunks & snapshot indexes in the destination path.
+    """
+
+    def __init__(self, DESTINATION_PATH):
+        self.DESTINATION_PATH = DESTINATION_PATH
+        self.chunks_path = os.path.join(DESTINATION_PATH, CHUNKS_DIRECTORY)
+
+
+    def backup(self, SOURCE_PATHS, snapshot_name):
+        """
+        Write source path files to the chunk store & record them in a new snapshot.
+        Files unchanged since the latest snapshot reuse its chunk list without being read again.
+        Return the snapshot & the size of the new chunks.
+        """
+        self.written_size = 0
+        previous_files = self.load_latest_snapshot()['files']
+        snapshot = {"dirs": [], "files": {}}
+
+        for entry in scan_source_paths(SOURCE_PATHS):
+            if entry.is_dir:
+                snapshot['dirs'].append(entry.path)
+                continue
+
+            signature = get_file_signature(entry.stat)
+            previous_file = previous_files.get(entry.path)
+            if previous_file and previous_file['signature'] == signature:
+                snapshot['files'][entry.path] = previous_file
+            else:
+                snapshot['files'][entry.path] = {"signature": signature, "chunks": self.write_file(entry.path)}
+
+        self.save_snapshot(snapshot_name, snapshot)
+        return snapshot, self.written_size
+
+
+    def write_file(self, filepath):
+        """
+        Split file into chunks, store the new ones & return the list of chunk ids.
+        """
+        chunk_ids = []
+        with open(filepath, 'rb') as file:
+            for chunk in iter_chunks(file):
+                chunk_id = hashlib.sha256(chunk).hexdigest()
+                chunk_path = self.get_chunk_path(chunk_id)
+                if not os.path.exists(chunk_path):  # Store each unique chunk once
+                    os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+                    with open(f"{chunk_path}.tmp", 'wb') as chunk_file:
+                        self.written_size += chunk_file.write(zlib.compress(chunk, int(config['compression_level'])))
+                    os.replace(f"{chunk_path}.tmp", chunk_path)
+                chunk_ids.append(chunk_id)
+        return chunk_ids
+
+
+    def restore(self, snapshot_name, target_path, patterns=None, skip_unchanged=False):
+        """
+        Rebuild the files of a snapshot (only those matching the patterns, if any) inside the target path.
+        With skip_unchanged, files already on disk with the same content are not written again.
+        Return the number of matching files.
+        """
+        snapshot = self.load_snapshot(snapshot_name)
+        for dirpath in snapshot['dirs']:
+            if matches_patterns(dirpath, patterns):
+                os.makedirs(self.get_target_path(dirpath, target_path), exist_ok=True)
+
+        files = {filepath: file for filepath, file in snapshot['files'].items() if matches_patterns(filepath, patterns)}
+        for filepath, file in files.items():
+            restored_filepath = self.get_target_path(filepath, target_path)
+            if skip_unchanged and self.is_unchanged(file, restored_filepath):
+                continue
+
+            os.makedirs(os.path.dirname(restored_filepath), exist_ok=True)
+            with open(restored_filepath, 'wb') as restored_file:
+                for chunk_id in file['chunks']:
+                    with open(self.get_chunk_path(chunk_id), 'rb') as chunk_file:
+                        restored_file.write(zlib.decompress(chunk_file.read()))
+            os.utime(restored_filepath, ns=(file['signature'][1], file['signature'][1]))
+        return len(files)
+
+
+    def is_unchanged(self, file, path):
+        """
+        Check if the file on disk matches a snapshot file: same size & chunks (only read if the size matches).
+        The file is left as it is (modification time included).
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+
+        if stat.st_size != file['signature'][0]:
+            return False
+        with open(path, 'rb') as disk_file:
+            return [hashlib.sha256(chunk).hexdigest() for chunk in iter_chunks(disk_file)] == file['chunks']
+
+
+    def collect_garbage(self):
+        """
+        Remove chunks that are not referenced by any snapshot (e.g. after expired snapshots were deleted).
+        """
+        if not os.path.isdir(self.chunks_path):
+            return
+
+        referenced_chunks = set()
+        for snapshot_name in self.list_snapshots():
+            for file in self.load_snapshot(snapshot_name)['files'].values():
+                referenced_chunks.update(file['chunks'])
+
+        for dirpath, _, filenames in os.walk(self.chunks_path):
+            for filename in filenames:
+                if filename not in referenced_chunks:
+                    os.remove(os.path.join(dirpath, filename))
+
+
+    def list_snapshots(self):
+        """
+        Return the names of the snapshots in the destination path (oldest first).
+        """
+        return sorted(filename.rpartition('.')[0] for filename in os.listdir(self.DESTINATION_PATH)
+                      if filename.endswith(f".{SNAPSHOT_EXTENSION}"))
+
+
+    def load_latest_snapshot(self):
+        """
+        Return the most recent snapshot, or an empty one if there are no snapshots yet.
+        """
+        snapshots = self.list_snapshots()
+        return self.load_snapshot(snapshots[-1]) if snapshots else {"dirs": [], "files": {}}
+
+
+    def load_snapshot(self, snapshot_name):
+        with open(self.get_snapshot_path(snapshot_name), 'r') as file:
+            return json.load(file)
+
+
+    def save_snapshot(self, snapshot_name, snapshot):
+        snapshot_path = self.get_snapshot_path(snapshot_name)
+        with open(f"{snapshot_path}.tmp", 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(f"{snapshot_path}.tmp", snapshot_path)
+
+
+    def get_snapshot_path(self, snapshot_name):
+        return os.path.join(self.DESTINATION_PATH, f"{snapshot_name}.{SNAPSHOT_EXTENSION}")
+
+
+    def get_chunk_path(self, chunk_id):
+        return os.path.join(self.chunks_path, chunk_id[:2], chunk_id)
+
+
+    def get_target_path(self, path, target_path):
+        """
+        Interpret absolute source path as relative to the target path (same layout as zip extraction).
+        """
+        relative_path = os.path.splitdrive(path)[1].replace('\\', '/').lstrip('/')
+        return os.path.join(target_path, relative_path)
@@ -4,6 +4,7 @@
 """
 This file allows you to sync your files with storage providers.
 It allows uploading, updating, and deleting files in a specified folder.
+Every provider implements the transfer engine interface (transfer_engine.py), which runs its transfers concurrently.
 Note: This feature becomes optional in the program. If you want to use it, just turn the cloud switch on,
 or set the JSON value to true.
 For detailed setup instructions:
@@ -13,56 +14,222 @@ https://github.com/KafetzisThomas/SafeArchive/blob/main/docs/sync_files_to_cloud
 
 import os
 import sys
+import time
+import shutil
+import posixpath
+import queue
 import ftplib
+import threading
 import dropbox
-from pydrive2.auth import GoogleAuth
+from pydrive2.auth import GoogleAuth, RefreshError
 from pydrive2.drive import GoogleDrive
 from pydrive2.settings import InvalidConfigError
+from googleapiclient.http import MediaFileUpload
+from .digests import get_file_digest
+from .transfer_engine import TransferProvider, TransferEngine, ProviderUnavailableError, list_local_files
+from .remote_inventory import load_partial_uploads, save_partial_uploads
+from .chunk_store import CHUNKS_DIRECTORY
 from .system_notifications import notify_user
 from .configs import config
 
 config.load()
 
+RESUMABLE_UPLOAD_SIZE = 32 * 1024 * 1024  # Bigger files are uploaded in chunks
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Must be a multiple of 256 KiB
+UPLOAD_RETRIES = 5
+BATCH_SIZE = 100  # Maximum number of requests in a Google Drive batch
+QUERY_FOLDERS = 50  # Google Drive folders listed per query
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+DROPBOX_CHUNK_SIZE = 8 * 1024 * 1024  # Upload session chunk size (multiple of 4 MiB)
+GOOGLE_DRIVE_CREDENTIALS_PATH = 'gdrive_credentials.json'  # Cached OAuth token, next to client_secrets.json
 
-class GoogleDriveCloud:
+google_drive_client = None  # Authenticated once per process
+google_drive_lock = threading.Lock()
+interactive_sign_in = True  # Disabled by the backup daemon, nobody can complete a browser sign-in there
+
+
+def set_interactive_sign_in(enabled):
+    """
+    Allow or forbid the browser sign-in to Google Drive (e.g. forbidden in the non-interactive backup daemon).
+    """
+    global interactive_sign_in
+    interactive_sign_in = enabled
+
+
+def sign_in_to_google_drive(gauth):
+    """
+    Sign in to Google Drive in the browser (cached token missing or revoked).
+    Raise ProviderUnavailableError instead if the browser sign-in isn't allowed, the upload is retried later.
+    """
+    if interactive_sign_in:
+        gauth.LocalWebserverAuth()
+        return
+    notify_user(
+        title='SafeArchive: [Error] Google Drive sign-in required.',
+        message='The Google Drive token is missing, expired or revoked. Sign in again from the CLI version (backup now).',
+        icon='error.ico'
+    )
+    raise ProviderUnavailableError("Google Drive sign-in required.")
+
+
+def get_google_drive():
+    """
+    Return the authenticated Google Drive client of the process (created on first use).
+    The OAuth token is cached in gdrive_credentials.json & refreshed when it expires,
+    so the browser sign-in only happens on the first run (or once the token was revoked).
+    """
+    global google_drive_client
+    with google_drive_lock:
+        if google_drive_client is None:
+            gauth = GoogleAuth()
+            gauth.settings['get_refresh_token'] = True  # Offline access, the token can be refreshed without the browser
+            gauth.LoadCredentialsFile(GOOGLE_DRIVE_CREDENTIALS_PATH)
+            if gauth.credentials is None:
+                sign_in_to_google_drive(gauth)
+            elif gauth.access_token_expired:
+                try:
+                    gauth.Refresh()
+                    gauth.Authorize()
+                except RefreshError:  # Revoked token
+                    gauth.credentials = None
+                    sign_in_to_google_drive(gauth)
+            else:
+                gauth.Authorize()
+            gauth.SaveCredentialsFile(GOOGLE_DRIVE_CREDENTIALS_PATH)
+            google_drive_client = GoogleDrive(gauth)
+        return google_drive_client
+
+
+class GoogleDriveCloud(TransferProvider):
     """
     Provide functionalities to backup files from a local directory to Google Drive.
     """
 
+    inventory_name = "google_drive"
+
+    def __init__(self):
+        self.thread_local = threading.local()  # HTTP clients of the upload threads
+        self.folders_lock = threading.RLock()
+
+
     def backup_to_google_drive(self, DESTINATION_PATH):
         """
-        Upload local backup files to Google Drive.
+        Upload new or changed local backup files & chunks to Google Drive (google_drive_transfers at once).
+        The SafeArchive folder is listed once (remote inventory), files with the same MD5 & size are skipped.
+        Return the number of bytes uploaded.
         """
+        return TransferEngine(self, config['google_drive_transfers']).sync(DESTINATION_PATH)
+
+
+    def connect(self):
         self.initialize_connection()
         if self.get_cloud_usage_percentage() < 90:
-            foldername = os.path.basename(DESTINATION_PATH[:-1])
-            self.gdrive_folder = self.get_or_create_folder(foldername)
-
-            for filename in os.listdir(DESTINATION_PATH[:-1]):
-                filepath = os.path.join(DESTINATION_PATH[:-1], filename)
-                gdrive_file = self.get_or_create_file(filename, filepath)
-                # Update existing files or upload new ones
-                gdrive_file.SetContentFile(filepath)
-                gdrive_file.Upload()
-
-            # Delete files in Google Drive that don't exist in the local folder anymore
-            self.delete_files_not_in_local_folder(DESTINATION_PATH[:-1])
+            return True
+        notify_user(
+            title='SafeArchive: [Warning] Your Google Drive storage is running out.',
+            message='Your Google Drive storage is almost full. To make sure your files can sync, clean up space.',
+            icon='cloud.ico'
+        )
+        return False
+
+
+    def get_upload_offset(self, DESTINATION_PATH, relative_path, remote_file, digests):
+        if remote_file is None or int(remote_file['fileSize'] or -1) != os.path.getsize(os.path.join(DESTINATION_PATH, relative_path)):
+            return 0  # Don't compute the MD5 of new files or files of another size
+        if relative_path.startswith(f"{CHUNKS_DIRECTORY}/"):  # Chunks are named after their content
+            return None
+        if remote_file['md5Checksum'] == get_file_digest(DESTINATION_PATH, relative_path, digests, "md5"):
+            return None
+        return 0
+
+
+    def upload_file(self, DESTINATION_PATH, relative_path, remote_file, offset):
+        """
+        Update an existing Drive file or upload a new one (in the subfolder of its path, e.g. chunks/ab).
+        """
+        if remote_file is None:
+            folder_path, _, title = relative_path.rpartition('/')
+            gdrive_file = self.drive.CreateFile({'title': title, 'parents': [{'id': self.get_folder_id(folder_path)}]})
         else:
-            notify_user(
-                title='SafeArchive: [Warning] Your Google Drive storage is running out.',
-                message='Your Google Drive storage is almost full. To make sure your files can sync, clean up space.',
-                icon='cloud.ico'
-            )
+            gdrive_file = self.drive.CreateFile({'id': remote_file['id']})
+        self.upload_content(gdrive_file, os.path.join(DESTINATION_PATH, relative_path))
+        return self.get_inventory_entry(gdrive_file)
+
+
+    def get_folder_id(self, folder_path):
+        """
+        Return the ID of a folder of the SafeArchive folder ('' for the SafeArchive folder itself), created if it doesn't exist yet.
+        """
+        with self.folders_lock:  # Uploads to a new folder start at the same time, only one of them creates it
+            if folder_path not in self.remote_folders:
+                parent_path, _, title = folder_path.rpartition('/')
+                gdrive_folder = self.drive.CreateFile({'title': title, 'mimeType': FOLDER_MIME_TYPE, 'parents': [{'id': self.get_folder_id(parent_path)}]})
+                gdrive_folder.http = self.get_http()
+                gdrive_folder.Upload()
+                self.remote_folders[folder_path] = gdrive_folder['id']
+            return self.remote_folders[folder_path]
+
+
+    def upload_backup_file(self, DESTINATION_PATH, filename):
+        """
+        Upload a single backup file (e.g. a finished backup volume, while the next one is being written).
+        The sync after the backup finds it in the SafeArchive folder with the same MD5 & size & skips it.
+        Return the number of bytes uploaded (size of the remote file).
+        """
+        if not hasattr(self, 'drive'):
+            self.initialize_connection()
+        file_list = self.drive.ListFile({'q': f"'{self.gdrive_folder['id']}' in parents and title='{filename}' and trashed=false"}).GetList()
+        gdrive_file = file_list[0] if file_list else self.drive.CreateFile({'title': filename, 'parents': [{'id': self.gdrive_folder['id']}]})
+        self.upload_content(gdrive_file, os.path.join(DESTINATION_PATH, filename))
+        return int(gdrive_file.get('fileSize') or 0)
+
+
+    def get_inventory_entry(self, gdrive_file):
+        return {"id": gdrive_file['id'], "md5Checksum": gdrive_file.get('md5Checksum'), "fileSize": gdrive_file.get('fileSize')}
+
+
+    def get_http(self):
+        """
+        Return the authorized HTTP client of the current thread (httplib2 clients can't be shared between threads).
+        """
+        if not hasattr(self.thread_local, 'http'):
+            self.thread_local.http = self.drive.auth.Get_Http_Object()
+        return self.thread_local.http
+
+
+    def upload_content(self, gdrive_file, filepath):
+        """
+        Upload the content of a local file to a Drive file.
+        Big files are sent as a resumable upload in chunks: a failed chunk is retried instead of the whole file.
+        """
+        gdrive_file.http = self.get_http()
+        if os.path.getsize(filepath) < RESUMABLE_UPLOAD_SIZE:
+            gdrive_file.SetContentFile(filepath)
+            gdrive_file.Upload()
+            gdrive_file.content.close()
+            return
+
+        media_body = MediaFileUpload(filepath, mimetype='application/octet-stream', chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+        if gdrive_file.get('id'):
+            request = self.drive.auth.service.files().update(
+                fileId=gdrive_file['id'], media_body=media_body, supportsAllDrives=True)
+        else:
+            request = self.drive.auth.service.files().insert(
+                body=gdrive_file.GetChanges(), media_body=media_body, supportsAllDrives=True)
+
+        response = None
+        while response is None:
+            _, response = request.next_chunk(http=gdrive_file.http, num_retries=UPLOAD_RETRIES)
+        gdrive_file.UpdateMetadata(response)
 
 
     def initialize_connection(self):
         """
         Authenticate request and initialize Google Drive.
+        The client & the SafeArchive folder are kept, so the next syncs of the process connect right away.
         """
         try:
-            gauth = GoogleAuth()
-            gauth.LocalWebserverAuth()
-            self.drive = GoogleDrive(gauth)
+            drive = get_google_drive()
         except InvalidConfigError:
             notify_user(
                 title='SafeArchive: [Error] File \'client_secrets.json\' is missing.',
@@ -70,9 +237,13 @@ class GoogleDriveCloud:
                 icon='file_missing.ico'
             )
             sys.exit()
+        if getattr(self, 'drive', None) is drive and hasattr(self, 'gdrive_folder'):
+            return
+        self.drive = drive
+        self.thread_local = threading.local()  # HTTP clients of the new connection
 
         # Check if the folder already exists in Google Drive
-        folder_query = ("title='SafeArchive' and mimeType='application/vnd.google-apps.folder' and trashed=false")
+        folder_query = (f"title='SafeArchive' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false")
         file_list = self.drive.ListFile({'q': folder_query}).GetList()
 
         if file_list:
@@ -81,7 +252,7 @@ class GoogleDriveCloud:
         else:
             # The folder doesn't exist, so create a new one
             self.gdrive_folder = self.drive.CreateFile(
-                {'title': 'SafeArchive', 'mimeType': 'application/vnd.google-apps.folder'})
+                {'title': 'SafeArchive', 'mimeType': FOLDER_MIME_TYPE})
             self.gdrive_folder.Upload()
 
 
@@ -96,56 +267,56 @@ class GoogleDriveCloud:
         return storage_usage_percentage
 
 
-    def get_or_create_folder(self, foldername):
+    def list_remote_files(self):
         """
-        Get or create folder in Google Drive.
+        List the SafeArchive folder & its subfolders (e.g. chunks), level by level: one query lists up to QUERY_FOLDERS folders.
+        Return the remote files (path relative to the SafeArchive folder -> ID, MD5 & size), the folder IDs are kept for the uploads.
         """
-        folder_query = (f"title='{foldername}' and mimeType='application/vnd.google-apps.folder' and trashed=false")
-        folder_list = self.drive.ListFile({'q': folder_query}).GetList()
+        remote_files = {}
+        self.remote_folders = {"": self.gdrive_folder['id']}  # Folder path -> ID
+        folders = [("", self.gdrive_folder['id'])]
+        while folders:
+            level, folders = folders, []
+            for start in range(0, len(level), QUERY_FOLDERS):
+                folder_paths = {folder_id: folder_path for folder_path, folder_id in level[start:start + QUERY_FOLDERS]}
+                parents_query = " or ".join(f"'{folder_id}' in parents" for folder_id in folder_paths)
+                for gdrive_file in self.drive.ListFile({'q': f"({parents_query}) and trashed=false"}).GetList():
+                    folder_path = next(folder_paths[parent['id']] for parent in gdrive_file['parents'] if parent['id'] in folder_paths)
+                    relative_path = f"{folder_path}/{gdrive_file['title']}" if folder_path else gdrive_file['title']
+                    if gdrive_file['mimeType'] == FOLDER_MIME_TYPE:
+                        self.remote_folders[relative_path] = gdrive_file['id']
+                        folders.append((relative_path, gdrive_file['id']))
+                    else:
+                        remote_files[relative_path] = self.get_inventory_entry(gdrive_file)
+        return remote_files
 
-        if folder_list:
-            return folder_list[0]
-        else:
-            folder_metadata = {'title': foldername}
-            if self.gdrive_folder['id']:
-                folder_metadata['parents'] = [{'id': self.gdrive_folder['id']}]
 
-            new_folder = self.drive.CreateFile(folder_metadata)
-            new_folder.Upload()
-            return new_folder
-
-
-    def get_or_create_file(self, filename):
+    def delete_files(self, relative_paths, remote_files):
         """
-        Get or create file in Google Drive.
+        Delete files in Google Drive that don't exist in the local folder.
         """
-        file_query = (f"title='{filename}' and '{self.gdrive_folder['id']}' in parents and trashed=false")
-        file_list = self.drive.ListFile({'q': file_query}).GetList()
+        self.trash_files([remote_files.pop(relative_path) for relative_path in relative_paths])
 
-        if file_list:
-            return file_list[0]
-        else:
-            new_file = self.drive.CreateFile({'title': filename, 'parents': [{'id': self.gdrive_folder['id']}]})
-            return new_file
 
-
-    def delete_files_not_in_local_folder(self, local_folder_path):
+    def trash_files(self, gdrive_files):
         """
-        Delete files in Google Drive that don't exist in the local folder.
+        Move files to the trash with batched requests (up to BATCH_SIZE files per round-trip).
         """
-        drive_files = self.drive.ListFile({'q': f"'{self.gdrive_folder['id']}' in parents and trashed=false"}).GetList()
-
-        for file in drive_files:
-            local_file_path = os.path.join(local_folder_path, file['title'])
-            if not os.path.exists(local_file_path):
-                file.Trash()
+        service = self.drive.auth.service
+        for start in range(0, len(gdrive_files), BATCH_SIZE):
+            batch = service.new_batch_http_request()
+            for gdrive_file in gdrive_files[start:start + BATCH_SIZE]:
+                batch.add(service.files().trash(fileId=gdrive_file['id'], supportsAllDrives=True))
+            batch.execute()
 
 
-class FTP:
+class FTP(TransferProvider):
     """
     Provide functionalities to backup files from a local directory to an FTP server.
     """
 
+    inventory_name = "ftp"
+
     def __init__(self):
         """
         Initialize FTP server connection.
@@ -154,31 +325,240 @@ class FTP:
         self.username = config['ftp_username']
         self.password = config['ftp_password']
         self.ftp_server = None
+        self.remote_directories = set()
+        self.idle_connections = queue.LifoQueue()  # Logged-in upload connections, reused by the next uploads
+        self.connection_slots = threading.BoundedSemaphore(max(int(config['ftp_connections']), 1))
+        self.partial_uploads_lock = threading.Lock()
 
 
     def backup_to_ftp_server(self, folderpath):
         """
-        Upload folder and files to the FTP server.
+        Upload new or changed files to the FTP server:
+            * Files with the same size as the remote file & not modified since its upload (SIZE/MDTM) are skipped.
+            * Interrupted uploads (e.g. after a dropped connection) are resumed from the remote size (REST).
+            * Several files are uploaded at once over a pool of up to ftp_connections logged-in connections.
+            * Subdirectories (e.g. chunks) are created on the server as needed.
+        Return the number of bytes uploaded.
         """
-        try:
-            self.initialize_connection()
-            self.create_directory()
+        return TransferEngine(self, config['ftp_connections']).sync(folderpath)
 
-            for file in os.listdir(folderpath):
-                file_path = os.path.join(folderpath, file)
-                if os.path.isfile(file_path):
-                    with open(file_path, 'rb') as f:
-                        self.ftp_server.storbinary(f'STOR {file}', f)
 
-            self.delete_files_not_in_local_folder(folderpath)
-            self.disconnect()
+    def connect(self):
+        self.check_credentials()
+        self.initialize_connection()
+        self.create_directory()
+        return True
 
-        except AttributeError:
+
+    def check_credentials(self):
+        """
+        Raise ProviderUnavailableError if the FTP server isn't configured (the upload is retried once it is).
+        """
+        if not self.hostname:
             notify_user(
                 title='SafeArchive: [Error] FTP credentials are missing.',
                 message='FTP not configured. Please edit the configuration file (settings.json) to add your ftp credentials.',
                 icon='error.ico'
             )
+            raise ProviderUnavailableError("FTP credentials are missing.")
+
+
+    def upload_backup_file(self, folderpath, file):
+        """
+        Upload a single backup file (e.g. a finished backup volume, while the next one is being written).
+        Return the number of bytes uploaded (size of the remote file).
+        """
+        self.check_credentials()
+        return self.upload_file(folderpath, file, None, 0)['size']
+
+
+    def list_remote_files(self):
+        """
+        Return the size & modification time (UTC, YYYYMMDDHHMMSS) of the remote files, subdirectories included (e.g. chunks).
+        The directories found are kept, so the uploads don't create them again.
+        """
+        remote_files, directories = {}, [""]
+        self.remote_directories = set()
+        while directories:
+            files, subdirectories = self.list_remote_directory(directories.pop())
+            remote_files.update(files)
+            directories.extend(subdirectories)
+            self.remote_directories.update(subdirectories)
+        return remote_files
+
+
+    def list_remote_directory(self, directory):
+        """
+        Return the files (relative path -> size & modification time) & subdirectories of a remote directory.
+        Use one MLSD listing if the server supports it, otherwise SIZE & MDTM for every file.
+        """
+        prefix = f"{directory}/" if directory else ""
+        try:
+            entries = list(self.ftp_server.mlsd(directory, facts=['type', 'size', 'modify']))
+            files = {prefix + name: {"size": int(facts['size']), "modify": facts['modify'][:14]}
+                     for name, facts in entries if facts.get('type') == 'file'}
+            return files, [prefix + name for name, facts in entries if facts.get('type') == 'dir']
+        except (ftplib.error_perm, KeyError):
+            files, subdirectories = {}, []
+            names = self.ftp_server.nlst(*([directory] if directory else []))
+            self.ftp_server.voidcmd('TYPE I')  # Servers may refuse SIZE in ASCII mode (set by NLST)
+            for name in names:
+                name = posixpath.basename(name)  # Some servers list the directory path too
+                if name in ('.', '..'):
+                    continue
+                try:
+                    files[prefix + name] = {"size": self.ftp_server.size(prefix + name), "modify": self.ftp_server.sendcmd(f'MDTM {prefix + name}')[4:18]}
+                except ftplib.error_perm:  # Not a file
+                    subdirectories.append(prefix + name)
+            return files, subdirectories
+
+
+    def get_upload_offset(self, folderpath, file, remote_file, digests):
+        """
+        Return where the upload of a local file has to start: 0 (whole file), the remote size (resume a partial upload)
+        or None (already uploaded). A remote file is only kept if it was uploaded after the local file was last modified.
+        A smaller remote file is only resumed if the upload of the same local file (size & modification time) was recorded
+        as interrupted: the server clock (MDTM) can't tell an unrelated file apart, appending to it would corrupt it.
+        """
+        file_path = os.path.join(folderpath, file)
+        if remote_file is None:
+            return 0
+
+        local_stat = os.stat(file_path)
+        local_modify = time.strftime('%Y%m%d%H%M%S', time.gmtime(local_stat.st_mtime))
+        if remote_file['modify'] < local_modify:
+            return 0
+
+        if remote_file['size'] == local_stat.st_size:
+            return None
+        with self.partial_uploads_lock:
+            partial_upload = load_partial_uploads(folderpath, self.inventory_name).get(file)
+        if remote_file['size'] < local_stat.st_size and partial_upload == [local_stat.st_size, local_stat.st_mtime_ns]:
+            return remote_file['size']
+        return 0
+
+
+    def upload_file(self, folderpath, file, remote_file, offset):
+        """
+        Upload a file (from the offset, REST) over a pooled connection, so several files can be uploaded in parallel.
+        The upload is recorded until it has finished, so the next sync can resume it if it's interrupted.
+        Return its remote size & modification time.
+        """
+        local_stat = os.stat(os.path.join(folderpath, file))
+        self.record_partial_upload(folderpath, file, [local_stat.st_size, local_stat.st_mtime_ns])
+        ftp_server = self.get_connection()
+        try:
+            self.create_remote_directories(ftp_server, file)
+            with open(os.path.join(folderpath, file), 'rb') as f:
+                f.seek(offset)
+                ftp_server.storbinary(f'STOR {file}', f, rest=offset or None)
+            remote_file = {"size": ftp_server.size(file), "modify": ftp_server.sendcmd(f'MDTM {file}')[4:18]}
+        except BaseException:
+            self.release_connection(ftp_server, reusable=False)  # Its state is unknown (e.g. transfer aborted)
+            raise
+        self.release_connection(ftp_server)
+        self.record_partial_upload(folderpath, file, None)
+        return remote_file
+
+
+    def record_partial_upload(self, folderpath, file, local_file):
+        """
+        Record the upload of a local file ([size, modification time]) as started, or as finished (None).
+        """
+        with self.partial_uploads_lock:
+            partial_uploads = load_partial_uploads(folderpath, self.inventory_name)
+            if local_file is None:
+                if partial_uploads.pop(file, None) is None:
+                    return
+            else:
+                partial_uploads[file] = local_file
+            save_partial_uploads(folderpath, self.inventory_name, partial_uploads)
+
+
+    def get_connection(self):
+        """
+        Return a logged-in connection (in the SafeArchive directory) from the pool, waiting while ftp_connections are in use.
+        Idle connections the server closed meanwhile are replaced by new ones.
+        """
+        self.connection_slots.acquire()
+        try:
+            while True:
+                try:
+                    ftp_server = self.idle_connections.get_nowait()
+                except queue.Empty:
+                    return self.open_connection()
+                try:
+                    ftp_server.voidcmd('NOOP')
+                    return ftp_server
+                except ftplib.all_errors:
+                    ftp_server.close()
+        except BaseException:
+            self.connection_slots.release()
+            raise
+
+
+    def open_connection(self):
+        """
+        Open & log in a new upload connection, in the SafeArchive directory.
+        """
+        ftp_server = ftplib.FTP(self.hostname, self.username, self.password)
+        ftp_server.encoding = "utf-8"
+        try:
+            try:
+                ftp_server.cwd('/SafeArchive')
+            except ftplib.error_perm:  # Not created yet (upload before the first sync)
+                try:
+                    ftp_server.mkd('/SafeArchive')
+                except ftplib.error_perm:  # Created by another connection meanwhile
+                    pass
+                ftp_server.cwd('/SafeArchive')
+        except BaseException:
+            ftp_server.close()
+            raise
+        return ftp_server
+
+
+    def release_connection(self, ftp_server, reusable=True):
+        """
+        Give a connection back to the pool, or close it if it can't be reused.
+        """
+        if reusable:
+            self.idle_connections.put(ftp_server)
+        else:
+            ftp_server.close()
+        self.connection_slots.release()
+
+
+    def close_connections(self):
+        """
+        Log out of the idle pooled connections.
+        """
+        while True:
+            try:
+                ftp_server = self.idle_connections.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                ftp_server.quit()
+            except ftplib.all_errors:
+                ftp_server.close()
+
+
+    def create_remote_directories(self, ftp_server, relative_path):
+        """
+        Create the directories of a remote file (e.g. chunks/ab) that don't exist yet.
+        """
+        directory = posixpath.dirname(relative_path)
+        parents = []
+        while directory and directory not in self.remote_directories:
+            parents.insert(0, directory)
+            directory = posixpath.dirname(directory)
+        for directory in parents:
+            try:
+                ftp_server.mkd(directory)
+            except ftplib.error_perm:  # Created by another upload meanwhile
+                pass
+            self.remote_directories.add(directory)
 
 
     def initialize_connection(self):
@@ -201,57 +581,166 @@ class FTP:
             self.ftp_server.cwd('/SafeArchive')
 
 
-    def delete_files_not_in_local_folder(self, folderpath):
+    def delete_files(self, files, remote_files):
         """
         Delete remote files that are not present locally.
         """
-        remote_files = self.ftp_server.nlst()
-
-        for file in remote_files:
-            if file not in os.listdir(folderpath):
-                self.ftp_server.delete(file)
+        for file in files:
+            self.ftp_server.delete(file)
+            del remote_files[file]
 
 
     def disconnect(self):
         """
-        Disconnect from the FTP Server.
+        Disconnect from the FTP Server (the listing connection & the idle upload connections).
         """
         if self.ftp_server:
             self.ftp_server.quit()
+            self.ftp_server = None
+        self.close_connections()
 
 
-class Dropbox:
+class Dropbox(TransferProvider):
     """
     Provide functionalities to backup files from a local directory to Dropbox.
     """
 
+    inventory_name = "dropbox"
+
     def upload_to_dropbox(self, DESTINATION_PATH):
         """
-        Upload folder and files to Dropbox account.
+        Upload new or changed files (backups & chunk store) to Dropbox account (dropbox_transfers at once).
+        Files with the same content hash as the remote ones are skipped & big files are streamed in chunks (upload sessions).
+        Return the number of bytes uploaded.
         """
+        return TransferEngine(self, config['dropbox_transfers']).sync(DESTINATION_PATH)
+
+
+    def connect(self):
         self.initialize_connection()
         if self.get_used_space_percentage() < 90:
             self.create_directory()
-            self.delete_directory(self.dropbox_folder_path)
-            for root, _, files in os.walk(DESTINATION_PATH):
-                for filename in files:
-                    local_file_path = os.path.join(root, filename)
-                    dropbox_file_path = os.path.join(self.dropbox_folder_path, os.path.relpath(local_file_path, DESTINATION_PATH))
-                    with open(local_file_path, 'rb') as f:
-                        self.dbx.files_upload(f.read(), dropbox_file_path, mode=dropbox.files.WriteMode.overwrite)
-        else:
-            notify_user(
-                title='SafeArchive: [Warning] Your Dropbox storage is running out.',
-                message='Your Dropbox storage is almost full. To make sure your files can sync, clean up space.',
-                icon='cloud.ico'
-            )
+            return True
+        notify_user(
+            title='SafeArchive: [Warning] Your Dropbox storage is running out.',
+            message='Your Dropbox storage is almost full. To make sure your files can sync, clean up space.',
+            icon='cloud.ico'
+        )
+        return False
+
+
+    def get_remote_key(self, relative_path):
+        return relative_path.lower()  # Dropbox paths are case-insensitive
+
+
+    def get_upload_offset(self, DESTINATION_PATH, relative_path, metadata, digests):
+        return None if self.is_uploaded(metadata, DESTINATION_PATH, relative_path, digests) else 0
+
+
+    def upload_file(self, DESTINATION_PATH, relative_path, metadata, offset):
+        return self.get_inventory_entry(
+            self.upload_content(os.path.join(DESTINATION_PATH, relative_path), f"{self.dropbox_folder_path}/{relative_path}"))
+
+
+    def delete_files(self, relative_paths, remote_files):
+        """
+        Delete the remote files of backups that were removed locally (e.g. expired).
+        """
+        for relative_path in relative_paths:
+            self.dbx.files_delete_v2(f"{self.dropbox_folder_path}/{relative_path}")
+            remote_files.pop(relative_path)
+
+
+    def upload_backup_file(self, DESTINATION_PATH, filename):
+        """
+        Upload a single backup file (e.g. a finished backup volume, while the next one is being written).
+        Return the number of bytes uploaded (size of the remote file).
+        """
+        if not hasattr(self, 'dbx'):
+            self.initialize_connection()
+            self.create_directory()
+        return self.upload_content(os.path.join(DESTINATION_PATH, filename), f"{self.dropbox_folder_path}/{filename}").size
+
+
+    def get_inventory_entry(self, metadata):
+        return {"content_hash": metadata.content_hash, "size": metadata.size}
+
+
+    def list_remote_files(self):
+        """
+        List the SafeArchive folder (recursively, in pages).
+        Return the remote files (lowercase path relative to the folder -> size & content hash).
+        """
+        return self.refresh_remote_inventory({"files": {}, "cursor": None})['files']
+
+
+    def refresh_remote_inventory(self, inventory):
+        """
+        Return the up to date remote inventory: only the changes since the saved cursor are listed,
+        the whole folder is listed again if there is no cursor or it expired.
+        """
+        remote_files, result = dict(inventory['files']), None
+        if inventory['cursor']:
+            try:
+                result = self.dbx.files_list_folder_continue(inventory['cursor'])
+            except dropbox.exceptions.ApiError:  # Expired cursor (reset)
+                pass
+        if result is None:
+            remote_files = {}
+            result = self.dbx.files_list_folder(self.dropbox_folder_path, recursive=True)
+
+        while True:
+            for metadata in result.entries:
+                relative_path = metadata.path_lower[len(self.dropbox_folder_path) + 1:]
+                if isinstance(metadata, dropbox.files.FileMetadata):
+                    remote_files[relative_path] = self.get_inventory_entry(metadata)
+                elif isinstance(metadata, dropbox.files.DeletedMetadata):  # A deleted folder deletes its files too
+                    for key in [key for key in remote_files if key == relative_path or key.startswith(f"{relative_path}/")]:
+                        del remote_files[key]
+            if not result.has_more:
+                return {"files": remote_files, "cursor": result.cursor}
+            result = self.dbx.files_list_folder_continue(result.cursor)
+
+
+    def is_uploaded(self, metadata, DESTINATION_PATH, relative_path, digests):
+        """
+        Check if a remote file has the same content as the local file.
+        Chunks are named after their content, so the same name & size is enough.
+        """
+        if metadata is None or metadata['size'] != os.path.getsize(os.path.join(DESTINATION_PATH, relative_path)):
+            return False
+        if relative_path.startswith(f"{CHUNKS_DIRECTORY}/"):
+            return True
+        return metadata['content_hash'] == get_file_digest(DESTINATION_PATH, relative_path, digests, "content_hash")
+
+
+    def upload_content(self, local_file_path, dropbox_file_path):
+        """
+        Upload a file: in one request if it's small, otherwise streamed from disk in fixed-size chunks through an upload session.
+        Return the metadata of the uploaded file.
+        """
+        file_size = os.path.getsize(local_file_path)
+        with open(local_file_path, 'rb') as f:
+            if file_size <= DROPBOX_CHUNK_SIZE:
+                return self.dbx.files_upload(f.read(), dropbox_file_path, mode=dropbox.files.WriteMode.overwrite)
+
+            session = self.dbx.files_upload_session_start(f.read(DROPBOX_CHUNK_SIZE))
+            cursor = dropbox.files.UploadSessionCursor(session_id=session.session_id, offset=f.tell())
+            commit = dropbox.files.CommitInfo(path=dropbox_file_path, mode=dropbox.files.WriteMode.overwrite)
+            while file_size - f.tell() > DROPBOX_CHUNK_SIZE:
+                self.dbx.files_upload_session_append_v2(f.read(DROPBOX_CHUNK_SIZE), cursor)
+                cursor.offset = f.tell()
+            return self.dbx.files_upload_session_finish(f.read(DROPBOX_CHUNK_SIZE), cursor, commit)
 
 
     def initialize_connection(self):
         """
         Authenticate access token.
+        The client (& its HTTP session) is kept for the next syncs of the process, until the access token changes.
         """
-        self.dbx = dropbox.Dropbox(config['dropbox_access_token'])
+        if getattr(self, 'access_token', None) != config['dropbox_access_token']:
+            self.dbx = dropbox.Dropbox(config['dropbox_access_token'])
+            self.access_token = config['dropbox_access_token']
         self.dropbox_folder_path = '/SafeArchive'
 
 
@@ -277,8 +766,81 @@ class Dropbox:
                 self.dbx.files_create_folder(self.dropbox_folder_path)
 
 
-    def delete_directory(self):
+class LocalDirectory(TransferProvider):
+    """
+    Provide functionalities to backup files from a local directory to another directory ("directory as cloud"),
+    e.g. a mounted network share or a second drive.
+    It's also a stand-in for the storage providers: syncs can be tested & benchmarked without network access.
+    """
+
+    inventory_name = "local_directory"
+
+    def __init__(self, directory_path=None):
+        self.directory_path = directory_path or config['local_directory_path']
+
+
+    def backup_to_local_directory(self, DESTINATION_PATH):
+        """
+        Copy new or changed files (backups & chunk store) to the SafeArchive folder of the directory (local_directory_transfers at once).
+        Files with the same size & modification time as the copies are skipped.
+        Return the number of bytes uploaded.
+        """
+        return TransferEngine(self, config['local_directory_transfers']).sync(DESTINATION_PATH)
+
+
+    def upload_backup_file(self, DESTINATION_PATH, filename):
+        """
+        Copy a single backup file (e.g. a finished backup volume, while the next one is being written).
+        Return the number of bytes uploaded (size of the copy).
+        """
+        self.connect()
+        return self.upload_file(DESTINATION_PATH, filename, None, 0)['size']
+
+
+    def connect(self):
+        if not self.directory_path:
+            notify_user(
+                title='SafeArchive: [Error] Local directory is missing.',
+                message='Local directory not configured. Please edit the configuration file (settings.json) to add its path.',
+                icon='error.ico'
+            )
+            raise ProviderUnavailableError("Local directory is missing.")
+        self.remote_path = os.path.join(self.directory_path, 'SafeArchive')
+        os.makedirs(self.remote_path, exist_ok=True)
+        return True
+
+
+    def list_remote_files(self):
         """
-        Delete existing directory so files to be overwritten.
+        Return the size & modification time (ns) of the copied files.
         """
-        self.dbx.files_delete_v2(self.dropbox_folder_path)
+        return {relative_path: self.get_remote_entry(relative_path) for relative_path in list_local_files(self.remote_path)}
+
+
+    def get_remote_entry(self, relative_path):
+        stat = os.stat(os.path.join(self.remote_path, relative_path))
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+    def get_upload_offset(self, DESTINATION_PATH, relative_path, remote_file, digests):
+        stat = os.stat(os.path.join(DESTINATION_PATH, relative_path))
+        if remote_file == {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}:
+            return None
+        return 0
+
+
+    def upload_file(self, DESTINATION_PATH, relative_path, remote_file, offset):
+        """
+        Copy a file with its modification time, through a temporary file (an interrupted copy is never taken for a complete one).
+        """
+        remote_file_path = os.path.join(self.remote_path, relative_path)
+        os.makedirs(os.path.dirname(remote_file_path), exist_ok=True)
+        shutil.copy2(os.path.join(DESTINATION_PATH, relative_path), f"{remote_file_path}.tmp")
+        os.replace(f"{remote_file_path}.tmp", remote_file_path)
+        return self.get_remote_entry(relative_path)
+
+
+    def delete_files(self, relative_paths, remote_files):
+        for relative_path in relative_paths:
+            os.remove(os.path.join(self.remote_path, relative_path))
+            del remote_files[relative_path]
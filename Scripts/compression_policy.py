@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file decides per zip entry whether a file is worth compressing.
+Already compressed data (media files, archives...) is stored as is (ZIP_STORED),
+based on its extension or on a quick trial compression of its first bytes.
+"""
+
+import os
+import zlib
+import pyzipper
+
+SAMPLE_SIZE = 16 * 1024
+MIN_SAMPLE_SIZE = 512  # Smaller files aren't sampled (compression overhead would dominate)
+MAX_COMPRESSED_RATIO = 0.9  # The sample must shrink by at least 10% to be compressed
+
+INCOMPRESSIBLE_EXTENSIONS = {
+    # Images
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif', '.avif', '.jxl',
+    # Audio & video
+    '.mp3', '.aac', '.m4a', '.ogg', '.opus', '.flac', '.wma',
+    '.mp4', '.m4v', '.mkv', '.mov', '.avi', '.webm', '.wmv', '.flv',
+    # Archives & compressed files
+    '.zip', '.7z', '.rar', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.lz4', '.lzma', '.cab', '.jar', '.apk',
+    # Documents (zip containers) & packages
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub', '.pdf', '.deb', '.rpm', '.msi', '.dmg',
+}
+
+
+def is_compressible(path, sample):
+    """
+    Check if a file is worth compressing, from its extension & a sample of its first bytes.
+    """
+    if os.path.splitext(path)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return False
+    if len(sample) < MIN_SAMPLE_SIZE:
+        return True
+
+    sample = sample[:SAMPLE_SIZE]
+    return len(zlib.compress(sample, 1)) <= len(sample) * MAX_COMPRESSED_RATIO
+
+
+def get_entry_compression_method(path, sample, compression_method):
+    """
+    Return the compression method for a zip entry: ZIP_STORED for incompressible data, otherwise the configured method.
+    """
+    if compression_method == pyzipper.ZIP_STORED or is_compressible(path, sample):
+        return compression_method
+    return pyzipper.ZIP_STORED
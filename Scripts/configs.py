@@ -65,15 +65,37 @@ config = ConfigDict({
         "encryption": "Enable/Disable encryption on backups (type: boolean)",
         "appearance_mode": "Appearance mode for the application (type: string)",
         "color_theme": "Color theme for the application (type: string)",
-        "backup_expiry_date": "Expiry date for the backups in the storage media (type: string)",
-        "storage_provider": "Storage provider for backups (Google Drive / FTP) (type: string)",
+        "backup_expiry_date": "Expiry date for the backups in the storage media (Generational: keep_daily, keep_weekly & keep_monthly backups) (type: string)",
+        "keep_daily": "Generational retention: number of daily backups to keep (type: integer)",
+        "keep_weekly": "Generational retention: number of weekly backups to keep (type: integer)",
+        "keep_monthly": "Generational retention: number of monthly backups to keep (type: integer)",
+        "background_pruning": "Remove expired backups in the background after the new backup has finished, instead of before it (type: boolean)",
+        "storage_provider": "Storage provider for backups (Google Drive / Dropbox / FTP / Local directory) (type: string)",
         "compression_method": "Specify the compression method for your backups (type: string)",
         "compression_level": "Specify compression level for zip files (backups) - 1: fast, 9: small size (type: integer)",
+        "zstd_long_distance_matching": "Enable/Disable long-distance matching for ZIP_ZSTANDARD (better ratio on big files, uses more memory) (type: boolean)",
+        "adaptive_compression": "Enable/Disable storing incompressible files (media, archives...) without compression (type: boolean)",
+        "compression_workers": "Number of workers compressing files in parallel (type: integer)",
+        "pipeline_memory_limit": "Maximum file data buffered between the read, compress & write stages of a backup (specify: MB) (type: integer)",
+        "restore_workers": "Number of worker threads extracting files in parallel during a restore (type: integer)",
+        "restore_mode": "Restore mode (Overwrite: write every file / Skip unchanged: write only missing or different files) (type: string)",
+        "verify_mode": "Backup verification (Structural: check the size & central directory only, corrupted data isn't detected / Deep: also read back & test every file against its CRC-32) (type: string)",
+        "volume_size": "Split zip backups into volumes of this size in MB, each volume is uploaded to the cloud as soon as it's finished (0: single zip file) (type: integer)",
+        "backup_mode": "Backup mode (Full: every file / Incremental: only new or changed files since the last backup) (type: string)",
+        "full_backup_interval": "Incremental mode: make a full backup every N days, so older backups can expire (0: only the first backup is full) (type: integer)",
+        "backup_repository": "Backup repository (Zip: dated zip files / Chunk store: deduplicated chunks & snapshots, without encryption) (type: string)",
         "backup_interval": "Set automatic backup frequency (specify: hours) (type: integer)",
+        "backup_password_file": "File holding the backup password, read by automatic backups when encryption is enabled (type: string)",
+        "change_journal": "Enable/Disable watching the source paths during automatic incremental backups, so only the changed paths are read instead of every folder (Linux) (type: boolean)",
         "ftp_hostname": "Hostname for FTP configuration (type: string)",
         "ftp_username": "Username for FTP configuration (type: string)",
         "ftp_password": "Password for FTP configuration (type: string)",
-        "dropbox_access_token": "Access Dropbox account using token with individual scopes (type: string)"
+        "ftp_connections": "Number of parallel FTP connections uploading files (type: integer)",
+        "dropbox_access_token": "Access Dropbox account using token with individual scopes (type: string)",
+        "google_drive_transfers": "Number of files uploaded to Google Drive at once (type: integer)",
+        "dropbox_transfers": "Number of files uploaded to Dropbox at once (type: integer)",
+        "local_directory_path": "Directory the backups are copied to with the Local directory storage provider, e.g. a network share (type: string)",
+        "local_directory_transfers": "Number of files copied to the local directory at once (type: integer)"
   },
     "platform": platform.system(),
     "source_paths": [
@@ -87,14 +109,36 @@ config = ConfigDict({
     "appearance_mode": "dark",
     "color_theme": "blue",
     "backup_expiry_date": "Forever",
+    "keep_daily": 7,
+    "keep_weekly": 4,
+    "keep_monthly": 12,
+    "background_pruning": False,
     "storage_provider": "None",
     "compression_method": "ZIP_DEFLATED",
     "compression_level": "5",
+    "zstd_long_distance_matching": False,
+    "adaptive_compression": True,
+    "compression_workers": os.cpu_count() or 1,
+    "pipeline_memory_limit": 256,
+    "restore_workers": os.cpu_count() or 1,
+    "restore_mode": "Overwrite",
+    "verify_mode": "Structural",
+    "volume_size": 0,
+    "backup_mode": "Full",
+    "full_backup_interval": 30,
+    "backup_repository": "Zip",
     "backup_interval": None,
+    "backup_password_file": "",
+    "change_journal": True,
     "ftp_hostname": "",
     "ftp_username": "",
     "ftp_password": "",
-    "dropbox_access_token": ""
+    "ftp_connections": 3,
+    "dropbox_access_token": "",
+    "google_drive_transfers": 4,
+    "dropbox_transfers": 4,
+    "local_directory_path": "",
+    "local_directory_transfers": 4
 }, SETTINGS_PATH)
 
 
@@ -111,14 +155,36 @@ def display_config_info():
         "Appearance mode": config['appearance_mode'],
         "Color theme": config['color_theme'],
         "Backup expiry date": config['backup_expiry_date'],
+        "Keep daily": config['keep_daily'],
+        "Keep weekly": config['keep_weekly'],
+        "Keep monthly": config['keep_monthly'],
+        "Background pruning": config['background_pruning'],
         "Storage provider": config['storage_provider'],
         "Compression method": config['compression_method'],
         "Compression level": config['compression_level'],
+        "Zstd long-distance matching": config['zstd_long_distance_matching'],
+        "Adaptive compression": config['adaptive_compression'],
+        "Compression workers": config['compression_workers'],
+        "Pipeline memory limit": config['pipeline_memory_limit'],
+        "Restore workers": config['restore_workers'],
+        "Restore mode": config['restore_mode'],
+        "Verify mode": config['verify_mode'],
+        "Volume size (MB)": config['volume_size'],
+        "Backup mode": config['backup_mode'],
+        "Full backup interval (days)": config['full_backup_interval'],
+        "Backup repository": config['backup_repository'],
         "Backup interval": config['backup_interval'],
+        "Backup password file": config['backup_password_file'],
+        "Change journal": config['change_journal'],
         "FTP hostname": config['ftp_hostname'],
         "FTP username": config['ftp_username'],
         "FTP password": config['ftp_password'],
-        "Dropbox access token": config['dropbox_access_token']
+        "FTP connections": config['ftp_connections'],
+        "Dropbox access token": config['dropbox_access_token'],
+        "Google Drive transfers": config['google_drive_transfers'],
+        "Dropbox transfers": config['dropbox_transfers'],
+        "Local directory path": config['local_directory_path'],
+        "Local directory transfers": config['local_directory_transfers']
     }
     
     print("Config Info:\n")
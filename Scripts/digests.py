@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file keeps the digests (MD5, Dropbox content hash) of the backup files in the destination path.
+A digest is computed once per file version (size & modification time), so syncing to the cloud
+doesn't read every archive again to find out which ones changed.
+The digests of a new backup are computed while it's written (see zip_utils.HashingFile) & recorded right away.
+"""
+
+import os
+import json
+import hashlib
+import threading
+
+DIGESTS_FILENAME = ".digests.json"
+READ_SIZE = 4 * 1024 * 1024
+DROPBOX_BLOCK_SIZE = 4 * 1024 * 1024
+PROVIDER_DIGEST_ALGORITHMS = {  # Digests compared with the remote files of each storage provider
+    "Google Drive": ["md5"],
+    "Dropbox": ["content_hash"]
+}
+
+digests_lock = threading.Lock()
+
+
+def load_digests(DESTINATION_PATH):
+    """
+    Load the digests file from the destination path.
+    Return empty digests if it doesn't exist or can't be read.
+    """
+    try:
+        with open(os.path.join(DESTINATION_PATH, DIGESTS_FILENAME), 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_digests(DESTINATION_PATH, digests):
+    """
+    Save the digests of the files that still exist in the destination path.
+    They are merged with the saved digests, so the digests recorded meanwhile (e.g. by a backup) are kept.
+    """
+    with digests_lock:
+        saved_digests = load_digests(DESTINATION_PATH)
+        digests = {filename: digest for filename, digest in {**saved_digests, **digests}.items()
+                   if os.path.exists(os.path.join(DESTINATION_PATH, filename))}
+        for filename, saved_digest in saved_digests.items():  # Don't replace a current saved digest with an outdated one
+            if filename in digests and saved_digest['signature'] == get_signature(os.path.join(DESTINATION_PATH, filename)):
+                if digests[filename]['signature'] == saved_digest['signature']:
+                    saved_digest = {**digests[filename], **saved_digest}
+                digests[filename] = saved_digest
+        digests_path = os.path.join(DESTINATION_PATH, DIGESTS_FILENAME)
+        with open(f"{digests_path}.tmp", 'w') as file:
+            json.dump(digests, file)
+        os.replace(f"{digests_path}.tmp", digests_path)  # Don't leave a half written digests file behind
+
+
+def get_signature(filepath):
+    """
+    Return the version of a file (size & modification time), its digests are valid until it changes.
+    """
+    stat = os.stat(filepath)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def record_file_digests(filepath, file_digests):
+    """
+    Record the digests of a file computed while it was written, for its current version (size & modification time).
+    """
+    save_digests(os.path.dirname(filepath), {os.path.basename(filepath): {"signature": get_signature(filepath), **file_digests}})
+
+
+class ContentHash:
+    """
+    Dropbox content hash computed incrementally: SHA-256 of the SHA-256 of every 4 MiB block.
+    """
+
+    def __init__(self):
+        self.block_hashes = hashlib.sha256()
+        self.block = hashlib.sha256()
+        self.block_size = 0
+
+
+    def update(self, data):
+        data = memoryview(data)
+        while data:
+            part = data[:DROPBOX_BLOCK_SIZE - self.block_size]
+            self.block.update(part)
+            self.block_size += len(part)
+            data = data[len(part):]
+            if self.block_size == DROPBOX_BLOCK_SIZE:
+                self.block_hashes.update(self.block.digest())
+                self.block, self.block_size = hashlib.sha256(), 0
+
+
+    def hexdigest(self):
+        block_hashes = self.block_hashes.copy()
+        if self.block_size:
+            block_hashes.update(self.block.digest())
+        return block_hashes.hexdigest()
+
+
+DIGEST_HASHERS = {
+    "md5": hashlib.md5,
+    "content_hash": ContentHash
+}
+
+
+def compute_digest(filepath, algorithm):
+    """
+    Return a digest (md5 / content_hash) of a file, read back from disk.
+    """
+    file_hash = DIGEST_HASHERS[algorithm]()
+    with open(filepath, 'rb') as file:
+        while True:
+            data = file.read(READ_SIZE)
+            if not data:
+                break
+            file_hash.update(data)
+    return file_hash.hexdigest()
+
+
+def get_file_digest(DESTINATION_PATH, filename, digests, algorithm):
+    """
+    Return a digest (md5 / content_hash) of a file in the destination path.
+    It's taken from the digests if the file didn't change since (same size & modification time).
+    """
+    filepath = os.path.join(DESTINATION_PATH, filename)
+    signature = get_signature(filepath)
+    digest = digests.get(filename)
+    if not digest or digest['signature'] != signature:
+        digest = digests[filename] = {"signature": signature}
+
+    if algorithm not in digest:
+        digest[algorithm] = compute_digest(filepath, algorithm)
+    return digest[algorithm]
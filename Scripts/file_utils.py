@@ -4,9 +4,17 @@
 import os
 import psutil
 import datetime
+import threading
 from .system_notifications import notify_user
+from .catalog import Catalog
+from .scanner import scan_tree
+from .chunk_store import ChunkStore, SNAPSHOT_EXTENSION
+from .retention import get_expired_backups
+from .volumes import get_backup_filename, remove_backup_files
 from .configs import config
 
+BACKUP_EXTENSIONS = ('.zip', f".{SNAPSHOT_EXTENSION}")
+
 
 def create_destination_directory_path(DESTINATION_PATH):
     """
@@ -31,16 +39,37 @@ def create_destination_directory_path(DESTINATION_PATH):
 
 def get_backup_size(DESTINATION_PATH):
     """
-    Walk through all files in the destination path & return the total size.
+    Return the size of the destination path from the catalog's size ledger (without walking the destination path).
+    """
+    with Catalog(DESTINATION_PATH) as catalog:
+        return catalog.get_total_size()
+
+
+def reconcile_backup_size(DESTINATION_PATH):
     """
+    Walk the destination path & correct the size ledger (files changed outside SafeArchive, chunks shared by expired snapshots...).
+    Backup files missing from the catalog (e.g. still being written) are not counted.
+    """
+    with Catalog(DESTINATION_PATH) as catalog:
+        version = catalog.get_ledger_version()
+        recorded_backups = {backup[0] for backup in catalog.list_backups()}
+
     total_size = 0
-    for dirpath, _, filenames in os.walk(DESTINATION_PATH):
-        for file in filenames:
-            filepath = os.path.join(dirpath, file)
-            # Add size of each file to total size
-            total_size += os.path.getsize(filepath)
+    for entry in scan_tree(DESTINATION_PATH):
+        filename = get_backup_filename(os.path.basename(entry.path))
+        if entry.is_dir or (filename.endswith(BACKUP_EXTENSIONS) and filename not in recorded_backups):
+            continue
+        total_size += entry.stat.st_size
+
+    with Catalog(DESTINATION_PATH) as catalog:
+        catalog.reconcile_size(total_size, version)
 
-    return total_size
+
+def start_backup_size_reconcile(DESTINATION_PATH):
+    """
+    Create and start a background thread that reconciles the size ledger.
+    """
+    threading.Thread(target=reconcile_backup_size, args=(DESTINATION_PATH,), daemon=True).start()
 
 
 def storage_media_free_space():
@@ -60,73 +89,47 @@ def get_drive_usage_percentage():
     return drive_usage_percentage
 
 
-def get_modification_time(file, DESTINATION_PATH):
-    """
-    Return the modification time of zip file.
-    """
-    file_path = os.path.join(DESTINATION_PATH, file)
-    return os.path.getmtime(file_path)
-
-
 def last_backup(DESTINATION_PATH):
     """
     Check if last backup is older than 30 days, if True then display a system notification message.
     Return last backup date.
     """
-    try:
-        files = [file for file in os.listdir(DESTINATION_PATH) if os.path.isfile(os.path.join(DESTINATION_PATH, file))]  # Get a list of all the files in the destination path
-        
-        # Sort the list of files based on their modification time
-        files.sort(key=lambda file: get_modification_time(DESTINATION_PATH, file))
-
-        # The most recently modified file
-        most_recently_modified_file = files[-1]
-        filename, _, filetype = most_recently_modified_file.partition('.')
-
-        # Get the modification time of the most recently modified file
-        modification_time = datetime.datetime.fromtimestamp(
-            os.path.getmtime(f"{DESTINATION_PATH}{most_recently_modified_file}"))
-
-        # Check if the file is older than three months
-        if modification_time < (datetime.datetime.now()) - (datetime.timedelta(days=30)):
-            notify_user(
-                title='SafeArchive: Reconnect your drive',
-                message='Your SafeArchive Drive was disconnected for too long. Reconnect it to keep saving copies of your files.',
-                icon='drive.ico'
-            )
-
-        if filetype != 'zip':
-            filename = "No backup"
-    except IndexError:
-        filename = "No backup"
+    with Catalog(DESTINATION_PATH) as catalog:
+        latest_backup = catalog.get_latest_backup()
+    if latest_backup is None:
+        return "No backup"
+
+    filename, created = latest_backup
+    modification_time = datetime.datetime.fromtimestamp(created)
+
+    # Check if the backup is older than 30 days
+    if modification_time < (datetime.datetime.now()) - (datetime.timedelta(days=30)):
+        notify_user(
+            title='SafeArchive: Reconnect your drive',
+            message='Your SafeArchive Drive was disconnected for too long. Reconnect it to keep saving copies of your files.',
+            icon='drive.ico'
+        )
     return filename
 
 
 def backup_expiry_date(DESTINATION_PATH):
     """
-    Check if previous backups are older than expiry date.
-    Remove every past backup if True.
-    """
-    is_valid_expiry_date  = True
-    for filename in os.listdir(DESTINATION_PATH):  # Iterate through all files in the destination directory
-        filepath = os.path.join(DESTINATION_PATH, filename)
-
-        modification_time = datetime.datetime.fromtimestamp(
-            os.path.getmtime(filepath))  # Get the modification time of the file
-
-        if config['backup_expiry_date'] == "1 month":
-            days = 30
-        elif config['backup_expiry_date'] == "3 months":
-            days = 90
-        elif config['backup_expiry_date'] == "6 months":
-            days = 180
-        elif config['backup_expiry_date'] == "9 months":
-            days = 270
-        elif config['backup_expiry_date'] == "1 year":
-            days = 365
-        else:
-            is_valid_expiry_date = False
-
-        # Check if the file is older than JSON value
-        if is_valid_expiry_date and modification_time < (datetime.datetime.now()) - (datetime.timedelta(days=int(days))):
-            os.remove(filepath)  # Delete the file
+    Remove the backups that the retention policy (backup_expiry_date) doesn't keep, in one batch.
+    """
+    with Catalog(DESTINATION_PATH) as catalog:
+        backups = [(backup[0], backup[3]) for backup in catalog.list_backups()]
+        expired_backups = get_expired_backups(backups, config['backup_expiry_date'], catalog.get_backup_parents())
+        for filename in expired_backups:
+            remove_backup_files(os.path.join(DESTINATION_PATH, filename))
+        catalog.remove_backups(expired_backups)
+
+    # Remove chunks that were only referenced by expired snapshots
+    if any(filename.endswith(f".{SNAPSHOT_EXTENSION}") for filename in expired_backups):
+        ChunkStore(DESTINATION_PATH).collect_garbage()
+
+
+def start_backup_expiry(DESTINATION_PATH):
+    """
+    Create and start a thread that removes the expired backups (the program waits for it to finish before exiting).
+    """
+    threading.Thread(target=backup_expiry_date, args=(DESTINATION_PATH,)).start()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file keeps track of the files included in the last backup (manifest).
+The manifest is used by the incremental backup mode to write only new or changed files.
+Incremental backups form a chain: each one records its parent backup (zip comment), up to the chain's full backup.
+"""
+
+import os
+import json
+import time
+from .volumes import backup_exists
+
+MANIFEST_FILENAME = ".manifest.json"
+DELETED_FILES_ENTRY = ".deleted_files.txt"  # Archive entry that lists files removed since the previous backup
+PARENT_BACKUP_COMMENT = "SafeArchive parent: "  # Zip comment of an incremental backup, followed by its parent backup
+
+
+def get_file_signature(stat):
+    """
+    Return the size, modification time & inode of a file (from its stat result).
+    """
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def load_manifest(DESTINATION_PATH):
+    """
+    Load the manifest file from the destination path.
+    Return an empty manifest if it doesn't exist or can't be read.
+    """
+    try:
+        with open(os.path.join(DESTINATION_PATH, MANIFEST_FILENAME), 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {"archive": None, "files": {}, "previous": {}}
+
+
+def get_parent_backup(DESTINATION_PATH, archive_name, full_backup_interval):
+    """
+    Return the backup an incremental backup is built on: (archive name, its files, creation time of the chain's full backup).
+    If the last backup is being overwritten (same day), return the backup it was built on instead.
+    Return None if a full backup is needed: there's no parent backup (or it was removed),
+    or the chain's full backup is older than full_backup_interval days.
+    """
+    manifest = load_manifest(DESTINATION_PATH)
+    if manifest['archive'] == archive_name:
+        parent, files = manifest.get('parent'), manifest['previous']
+    else:
+        parent, files = manifest['archive'], manifest['files']
+    chain_started = manifest.get('chain_started')  # Missing in manifests written before backup chains were recorded
+
+    if parent is None or chain_started is None or not backup_exists(os.path.join(DESTINATION_PATH, parent)):
+        return None
+    if full_backup_interval and time.time() - chain_started >= full_backup_interval * 24 * 60 * 60:
+        return None
+    return parent, files, chain_started
+
+
+def get_parent_comment(parent):
+    return bytes(PARENT_BACKUP_COMMENT + parent, 'utf-8')
+
+
+def read_parent_comment(comment):
+    """
+    Return the parent backup recorded in the zip comment of an incremental backup (None for a full backup).
+    """
+    comment = comment.decode('utf-8', errors='replace')
+    if comment.startswith(PARENT_BACKUP_COMMENT):
+        return comment[len(PARENT_BACKUP_COMMENT):]
+    return None
+
+
+def save_manifest(DESTINATION_PATH, archive_name, files, previous_files, parent, chain_started):
+    """
+    Save the files included in the backup to the manifest file, with the backup chain it belongs to.
+    """
+    manifest = {"archive": archive_name, "files": files, "previous": previous_files, "parent": parent, "chain_started": chain_started}
+    filepath = os.path.join(DESTINATION_PATH, MANIFEST_FILENAME)
+    with open(f"{filepath}.tmp", 'w') as file:
+        json.dump(manifest, file)
+    os.replace(f"{filepath}.tmp", filepath)  # Never leave a half-written manifest behind
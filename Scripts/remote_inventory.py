@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file keeps a local copy of what a storage provider holds (remote inventory): name, size & content hash
+(Google Drive MD5, Dropbox content hash, FTP size & modification time) of each file.
+The transfer engine refreshes it at every sync (incrementally where the provider can list changes, e.g. Dropbox cursor)
+& only uploads the files whose local digest differs from the inventory.
+"""
+
+import os
+import json
+from .digests import DIGESTS_FILENAME
+from .upload_queue import QUEUE_FILENAME
+from .change_journal import JOURNAL_FILENAME
+from .manifest import MANIFEST_FILENAME
+from .catalog import CATALOG_FILENAME
+
+INVENTORY_PREFIX = ".remote_inventory_"
+PARTIAL_UPLOADS_PREFIX = ".partial_uploads_"
+SQLITE_SUFFIXES = ("", "-journal", "-wal", "-shm")  # The catalog database & the files SQLite keeps next to it while writing
+LOCAL_ONLY_FILENAMES = (DIGESTS_FILENAME, QUEUE_FILENAME, JOURNAL_FILENAME, MANIFEST_FILENAME) + tuple(CATALOG_FILENAME + suffix for suffix in SQLITE_SUFFIXES)
+
+
+def get_inventory_path(DESTINATION_PATH, provider):
+    return os.path.join(DESTINATION_PATH, f"{INVENTORY_PREFIX}{provider}.json")
+
+
+def load_remote_inventory(DESTINATION_PATH, provider):
+    """
+    Load the remote inventory of a storage provider: its files (key -> remote entry) & listing cursor.
+    Return an empty inventory if it doesn't exist or can't be read.
+    """
+    try:
+        with open(get_inventory_path(DESTINATION_PATH, provider), 'r') as file:
+            inventory = json.load(file)
+        if "files" in inventory:
+            return inventory
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return {"files": {}, "cursor": None}
+
+
+def save_remote_inventory(DESTINATION_PATH, provider, inventory):
+    inventory_path = get_inventory_path(DESTINATION_PATH, provider)
+    with open(f"{inventory_path}.tmp", 'w') as file:
+        json.dump(inventory, file)
+    os.replace(f"{inventory_path}.tmp", inventory_path)  # Don't leave a half written inventory behind
+
+
+def get_partial_uploads_path(DESTINATION_PATH, provider):
+    return os.path.join(DESTINATION_PATH, f"{PARTIAL_UPLOADS_PREFIX}{provider}.json")
+
+
+def load_partial_uploads(DESTINATION_PATH, provider):
+    """
+    Load the uploads to a storage provider that were started but didn't finish (relative path -> size & modification time
+    of the local file being uploaded). Only these remote files may be resumed, a smaller remote file can be anything else
+    (e.g. an older file of the same name).
+    Return no uploads if the file doesn't exist or can't be read.
+    """
+    try:
+        with open(get_partial_uploads_path(DESTINATION_PATH, provider), 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_partial_uploads(DESTINATION_PATH, provider, partial_uploads):
+    partial_uploads_path = get_partial_uploads_path(DESTINATION_PATH, provider)
+    with open(f"{partial_uploads_path}.tmp", 'w') as file:
+        json.dump(partial_uploads, file)
+    os.replace(f"{partial_uploads_path}.tmp", partial_uploads_path)
+
+
+def is_local_only(filename):
+    """
+    Check if a file in the destination path is local bookkeeping that isn't synced
+    (digests, inventories, partial uploads, upload queue, change journal, manifest, catalog database, temporary files).
+    The catalog is rebuilt from the backups, so it's never uploaded (it may be written to during the sync).
+    """
+    return filename in LOCAL_ONLY_FILENAMES or filename.startswith((INVENTORY_PREFIX, PARTIAL_UPLOADS_PREFIX)) or filename.endswith('.tmp')
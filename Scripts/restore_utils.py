@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file provides selective, parallel & differential restores.
+Only the backup entries matching the given path patterns are extracted: they are found in the zip central directory
+(or the snapshot index), so restore time depends on the size of the requested files, not on the size of the backup.
+The entries are split into groups of similar size & each worker thread opens the archive & extracts its own group,
+so decompression & decryption use every core (zlib, zstandard & the AES cipher release the GIL).
+Files already on disk with the same size & CRC32 as their entry can be skipped.
+An incremental backup is restored with its chain: the full backup, then each incremental backup (files & deletion list) in order.
+"""
+
+import os
+import time
+import zlib
+from fnmatch import fnmatchcase
+from concurrent.futures import ThreadPoolExecutor
+from .manifest import DELETED_FILES_ENTRY, read_parent_comment
+from .volumes import backup_exists, open_backup
+from .zstd_utils import register_zstandard
+
+MIN_PARALLEL_SIZE = 16 * 1024 * 1024  # Smaller restores are extracted in the current thread
+READ_SIZE = 1024 * 1024
+
+register_zstandard()  # Zstandard backups can be restored
+
+
+def normalize_path(path):
+    """
+    Return a path in the zip entry layout (forward slashes, no drive or leading/trailing slash).
+    """
+    return os.path.splitdrive(path.strip())[1].replace('\\', '/').strip('/')
+
+
+def parse_patterns(text):
+    """
+    Split a comma separated list of path patterns (empty list for everything).
+    """
+    return [normalize_path(pattern) for pattern in text.split(',') if normalize_path(pattern)]
+
+
+def matches_patterns(path, patterns):
+    """
+    Check if a path matches any pattern: exact file, folder subtree or wildcard (e.g. *.xlsx).
+    An empty list of patterns matches every path.
+    """
+    if not patterns:
+        return True
+
+    path = normalize_path(path)
+    return any(path == pattern or path.startswith(pattern + '/') or fnmatchcase(path, pattern) for pattern in patterns)
+
+
+def get_matching_members(zipObj, patterns):
+    """
+    Return the zip entries (from the central directory) that match the patterns.
+    """
+    return [zinfo for zinfo in zipObj.infolist()
+            if zinfo.filename != DELETED_FILES_ENTRY and matches_patterns(zinfo.filename, patterns)]
+
+
+def get_backup_chain(file_name):
+    """
+    Return the zip backups needed to restore a backup, oldest first: its full backup, then each incremental backup up to it.
+    Raise FileNotFoundError if a backup of the chain is missing.
+    """
+    chain = [file_name]
+    while True:
+        with open_backup(chain[0]) as zipObj:
+            parent = read_parent_comment(zipObj.comment)
+        if parent is None:
+            return chain
+
+        parent_file_name = os.path.join(os.path.dirname(file_name), parent)
+        if not backup_exists(parent_file_name) or parent_file_name in chain:
+            raise FileNotFoundError(f"The backup '{parent}' that '{os.path.basename(file_name)}' is built on is missing.")
+        chain.insert(0, parent_file_name)
+
+
+def get_deleted_files(zipObj):
+    """
+    Return the files removed since the previous backup (deletion list of an incremental backup).
+    """
+    if DELETED_FILES_ENTRY not in zipObj.NameToInfo:
+        return []
+    return zipObj.read(DELETED_FILES_ENTRY).decode('utf-8').split("\n")
+
+
+def get_chain_members(chain, patterns, password=None):
+    """
+    Return the entries to extract from each backup of a chain (file name -> entry names), oldest first.
+    Each path is taken from the newest backup that has it, unless a later deletion list removed it.
+    Return the number of matching entries as well.
+    """
+    latest_members = {}  # Normalized path -> (backup file name, entry name)
+    for file_name in chain:
+        with open_backup(file_name) as zipObj:
+            if password:
+                zipObj.setpassword(password)
+            for path in get_deleted_files(zipObj):
+                latest_members.pop(normalize_path(path), None)
+            for zinfo in get_matching_members(zipObj, patterns):
+                latest_members[normalize_path(zinfo.filename)] = (file_name, zinfo.filename)
+
+    chain_members = {file_name: [] for file_name in chain}
+    for file_name, member_name in latest_members.values():
+        chain_members[file_name].append(member_name)
+    return chain_members, len(latest_members)
+
+
+def restore_backup(file_name, patterns, target_path, password=None, workers=1, skip_unchanged=False):
+    """
+    Restore the files matching the patterns as they were when the backup was made (with its backup chain).
+    Return the number of matching entries.
+    """
+    chain_members, matching_entries = get_chain_members(get_backup_chain(file_name), patterns, password)
+    for chain_file_name, member_names in chain_members.items():
+        if not member_names:
+            continue
+        with open_backup(chain_file_name) as zipObj:
+            if password:
+                zipObj.setpassword(password)
+            members = [zipObj.getinfo(member_name) for member_name in member_names]
+            if skip_unchanged:
+                members = get_changed_members(members, target_path)
+            extract_members_parallel(zipObj, members, target_path, password, workers)
+    return matching_entries
+
+
+def extract_members(zipObj, members, target_path):
+    """
+    Extract only the given zip entries inside the target path.
+    """
+    for zinfo in members:
+        set_entry_mtime(zinfo, zipObj.extract(zinfo, target_path))
+    return len(members)
+
+
+def get_entry_mtime(zinfo):
+    return time.mktime(zinfo.date_time + (0, 0, -1))
+
+
+def set_entry_mtime(zinfo, path):
+    """
+    Give an extracted file the modification time of its entry, so later restores can compare it without reading it.
+    """
+    if not zinfo.is_dir():
+        os.utime(path, (get_entry_mtime(zinfo), get_entry_mtime(zinfo)))
+
+
+def get_file_crc(path):
+    crc = 0
+    with open(path, 'rb') as file:
+        while True:
+            data = file.read(READ_SIZE)
+            if not data:
+                break
+            crc = zlib.crc32(data, crc)
+    return crc
+
+
+def is_unchanged(zinfo, path):
+    """
+    Check if the file on disk matches a zip entry: same size & CRC32 (only read if the size matches).
+    The file is left as it is (modification time included).
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+
+    if stat.st_size != zinfo.file_size:
+        return False
+    return get_file_crc(path) == zinfo.CRC
+
+
+def get_changed_members(members, target_path):
+    """
+    Return the zip entries that are missing or different in the target path (folders are always kept).
+    """
+    return [zinfo for zinfo in members if zinfo.is_dir() or not is_unchanged(zinfo, get_extract_path(zinfo, target_path))]
+
+
+def get_extract_path(zinfo, target_path):
+    """
+    Return the path a zip entry is extracted to (same rules as zipfile: no drive, no '.' or '..' components).
+    """
+    arcname = os.path.splitdrive(zinfo.filename.replace('/', os.path.sep))[1]
+    parts = [part for part in arcname.split(os.path.sep) if part not in ('', os.path.curdir, os.path.pardir)]
+    return os.path.join(target_path, *parts)
+
+
+def split_members(members, workers):
+    """
+    Split the zip entries into (at most) one group per worker, balanced by compressed size.
+    """
+    groups = [[] for _ in range(min(workers, len(members)))]
+    group_sizes = [0] * len(groups)
+    for zinfo in sorted(members, key=lambda zinfo: zinfo.compress_size, reverse=True):
+        smallest_group = group_sizes.index(min(group_sizes))
+        groups[smallest_group].append(zinfo.filename)
+        group_sizes[smallest_group] += zinfo.compress_size
+    return groups
+
+
+def extract_group(file_name, member_names, target_path, password):
+    """
+    Open the archive & extract a group of zip entries (runs in a worker thread, with its own file handle).
+    """
+    with open_backup(file_name) as zipObj:
+        if password:
+            zipObj.setpassword(password)
+        for member_name in member_names:
+            zinfo = zipObj.getinfo(member_name)
+            set_entry_mtime(zinfo, zipObj.extract(zinfo, target_path))
+    return len(member_names)
+
+
+def extract_members_parallel(zipObj, members, target_path, password=None, workers=1):
+    """
+    Extract the given zip entries inside the target path, using several workers for big restores.
+    Return the number of extracted entries.
+    """
+    files = [zinfo for zinfo in members if not zinfo.is_dir()]
+    if workers <= 1 or len(files) < 2 or sum(zinfo.compress_size for zinfo in files) < MIN_PARALLEL_SIZE:
+        return extract_members(zipObj, members, target_path)
+
+    # Create the folders first, so the workers don't race to create them
+    extract_members(zipObj, [zinfo for zinfo in members if zinfo.is_dir()], target_path)
+    for folder in {os.path.dirname(get_extract_path(zinfo, target_path)) for zinfo in files}:
+        os.makedirs(folder, exist_ok=True)
+
+    # Threads, not processes: the app already runs threads (upload queue, compressors, Tk), forking it could deadlock
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [executor.submit(extract_group, zipObj.filename, group, target_path, password)
+                   for group in split_members(files, workers)]
+        return len(members) - len(files) + sum(future.result() for future in futures)
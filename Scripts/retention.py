@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file decides which backups are kept (retention policy, set by backup_expiry_date):
+    * 1 month ... 1 year: keep the backups newer than the expiry date.
+    * Generational (grandfather-father-son): keep the newest backup of each of the last
+      keep_daily days, keep_weekly weeks & keep_monthly months.
+The expired backups are found in one pass over the backups recorded in the catalog.
+A backup that a kept incremental backup is built on (up to the chain's full backup) is kept as long as the chain is needed.
+"""
+
+import time
+import datetime
+from .configs import config
+
+EXPIRY_DAYS = {
+    "1 month": 30,
+    "3 months": 90,
+    "6 months": 180,
+    "9 months": 270,
+    "1 year": 365
+}
+
+
+def get_periods(created):
+    """
+    Return the day, week & month a backup belongs to.
+    """
+    day = datetime.date.fromtimestamp(created)
+    return {"daily": day, "weekly": day.isocalendar()[:2], "monthly": (day.year, day.month)}
+
+
+def get_generational_backups(backups, keep_counts):
+    """
+    Return the filenames of the backups to keep: the newest backup of each of the last N days, weeks & months.
+    backups: (filename, creation time) pairs, oldest first (catalog order).
+    """
+    kept_backups = set()
+    kept_periods = {period: set() for period in keep_counts}
+    for filename, created in reversed(backups):
+        for period, key in get_periods(created).items():
+            if key not in kept_periods[period] and len(kept_periods[period]) < keep_counts[period]:
+                kept_periods[period].add(key)
+                kept_backups.add(filename)
+    return kept_backups
+
+
+def get_chain_backups(kept_backups, parents):
+    """
+    Return the backups the kept backups are built on: the parents of each incremental backup, up to its full backup.
+    """
+    chain_backups = set()
+    for filename in kept_backups:
+        parent = parents.get(filename)
+        while parent and parent not in chain_backups:
+            chain_backups.add(parent)
+            parent = parents.get(parent)
+    return chain_backups
+
+
+def get_expired_backups(backups, expiry_date, parents=None):
+    """
+    Return the filenames of the backups that the retention policy doesn't keep.
+    backups: (filename, creation time) pairs, oldest first (catalog order).
+    parents: the backup each incremental backup is built on (filename -> parent filename).
+    """
+    if expiry_date == "Generational":
+        kept_backups = get_generational_backups(backups, {
+            "daily": int(config['keep_daily']),
+            "weekly": int(config['keep_weekly']),
+            "monthly": int(config['keep_monthly'])
+        })
+    elif expiry_date in EXPIRY_DAYS:
+        oldest_kept = time.time() - EXPIRY_DAYS[expiry_date] * 24 * 60 * 60
+        kept_backups = {filename for filename, created in backups if created >= oldest_kept}
+    else:  # Forever
+        return []
+
+    kept_backups |= get_chain_backups(kept_backups, parents or {})
+    return [filename for filename, _ in backups if filename not in kept_backups]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file scans source paths in a single pass (os.scandir) & caches the stat result of every entry,
+so backups, size accounting & progress estimation don't need to stat the same files again.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+ScanEntry = namedtuple('ScanEntry', ['path', 'is_dir', 'stat'])
+
+
+def scan_tree(path):
+    """
+    Walk through a folder (like os.walk) & yield its files and folders with their stat results.
+    Unreadable folders & broken links are skipped.
+    """
+    folders = [path]
+    while folders:
+        folder = folders.pop()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+
+                    yield ScanEntry(entry.path, is_dir, stat)
+                    if is_dir and not entry.is_symlink():  # Don't follow symlinks to folders (same as os.walk)
+                        folders.append(entry.path)
+        except OSError:
+            continue
+
+
+def scan_source_paths(SOURCE_PATHS):
+    """
+    Scan several source paths at once (one thread per path).
+    Return the list of entries, grouped by source path.
+    """
+    with ThreadPoolExecutor(max_workers=max(len(SOURCE_PATHS), 1)) as executor:
+        results = executor.map(lambda path: list(scan_tree(path)), SOURCE_PATHS)
+    return [entry for entries in results for entry in entries]
+
+
+def get_total_size(entries):
+    """
+    Return the total size of the files in the scanned entries.
+    """
+    return sum(entry.stat.st_size for entry in entries if not entry.is_dir)
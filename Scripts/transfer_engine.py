@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file provides a provider-neutral transfer engine: it syncs the destination path with a storage provider
+through a common interface (TransferProvider) & runs the transfers concurrently with asyncio,
+up to a per-provider limit (google_drive_transfers, dropbox_transfers, ftp_connections, local_directory_transfers).
+Storage provider SDKs are blocking, so every provider call runs in a thread pool of the same size as the limit.
+The remote files are kept in a remote inventory that each sync refreshes, files whose local digest
+(computed once, see digests.py) matches their remote entry are not uploaded again.
+"""
+
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .digests import load_digests, save_digests
+from .remote_inventory import load_remote_inventory, save_remote_inventory, is_local_only
+
+
+class ProviderUnavailableError(Exception):
+    """
+    The storage provider can't take the upload (e.g. storage almost full, missing credentials), the sync has to be retried.
+    """
+
+
+def list_local_files(DESTINATION_PATH):
+    """
+    Return the files of the destination path & its subfolders to sync (e.g. chunks), as paths relative to the destination path ('/' separated).
+    Local bookkeeping (digests, inventories, upload queue...) is skipped.
+    """
+    local_files = []
+    for root, directories, files in os.walk(DESTINATION_PATH):
+        for filename in files:
+            if not is_local_only(filename):
+                local_files.append(os.path.relpath(os.path.join(root, filename), DESTINATION_PATH).replace(os.sep, '/'))
+    return local_files
+
+
+class TransferProvider:
+    """
+    Common interface of the storage providers synced by the transfer engine.
+    The methods are blocking & run in the engine's worker threads, upload_file may run in several threads at once.
+    Remote entries are dictionaries (saved in the remote inventory, named after inventory_name).
+    """
+
+    inventory_name = None
+
+    def connect(self):
+        """
+        Connect to the storage provider.
+        Return False if it can't take the upload (e.g. storage almost full), the sync raises ProviderUnavailableError.
+        """
+        return True
+
+
+    def disconnect(self):
+        pass
+
+
+    def get_local_files(self, DESTINATION_PATH):
+        return list_local_files(DESTINATION_PATH)
+
+
+    def get_remote_key(self, relative_path):
+        """
+        Return the key of a local file in the remote files (e.g. lowercase path for case-insensitive providers).
+        """
+        return relative_path
+
+
+    def list_remote_files(self):
+        """
+        Return the remote files (key -> remote entry).
+        """
+        raise NotImplementedError
+
+
+    def refresh_remote_inventory(self, inventory):
+        """
+        Return the up to date remote inventory (files & listing cursor), from the saved one.
+        The remote files are listed again, providers that can list the changes since the cursor only fetch those.
+        """
+        return {"files": self.list_remote_files(), "cursor": None}
+
+
+    def get_upload_offset(self, DESTINATION_PATH, relative_path, remote_file, digests):
+        """
+        Return where the upload of a local file has to start: 0 (whole file), an offset (resume a partial upload)
+        or None (already uploaded).
+        """
+        raise NotImplementedError
+
+
+    def upload_file(self, DESTINATION_PATH, relative_path, remote_file, offset):
+        """
+        Upload a local file (from the offset).
+        Return its new remote entry.
+        """
+        raise NotImplementedError
+
+
+    def delete_files(self, keys, remote_files):
+        """
+        Delete remote files that are not present locally (& remove them from the remote files).
+        """
+        raise NotImplementedError
+
+
+class TransferEngine:
+    """
+    Sync the destination path with a storage provider, running up to `limit` transfers at once.
+    The number of files & bytes uploaded by the last sync & its duration are kept for throughput reports.
+    """
+
+    def __init__(self, provider, limit):
+        self.provider = provider
+        self.limit = max(int(limit), 1)
+        self.uploaded_files = 0
+        self.uploaded_bytes = 0
+        self.elapsed_time = 0
+
+
+    def sync(self, DESTINATION_PATH):
+        """
+        Upload new or changed files & delete the remote files removed locally.
+        Return the number of bytes uploaded, raise ProviderUnavailableError if the storage provider can't take the upload.
+        """
+        start = time.time()
+        self.uploaded_files, self.uploaded_bytes = 0, 0
+        with ThreadPoolExecutor(max_workers=self.limit) as self.executor:
+            asyncio.run(self.run_sync(DESTINATION_PATH))
+        self.elapsed_time = time.time() - start
+        return self.uploaded_bytes
+
+
+    async def call(self, function, *args):
+        """
+        Run a blocking provider call in the engine's worker threads.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+
+    async def run_sync(self, DESTINATION_PATH):
+        if not await self.call(self.provider.connect):
+            raise ProviderUnavailableError(f"The storage provider ({self.provider.inventory_name}) can't take the upload.")
+        try:
+            digests = load_digests(DESTINATION_PATH)
+            local_files = await self.call(self.provider.get_local_files, DESTINATION_PATH)
+            inventory = await self.call(self.provider.refresh_remote_inventory, load_remote_inventory(DESTINATION_PATH, self.provider.inventory_name))
+            remote_files = inventory['files']
+
+            semaphore = asyncio.Semaphore(self.limit)
+            await asyncio.gather(*(self.transfer(semaphore, DESTINATION_PATH, relative_path, remote_files, digests)
+                                   for relative_path in local_files))
+
+            deleted_files = set(remote_files) - {self.provider.get_remote_key(relative_path) for relative_path in local_files}
+            if deleted_files:
+                await self.call(self.provider.delete_files, sorted(deleted_files), remote_files)
+            save_digests(DESTINATION_PATH, digests)
+            save_remote_inventory(DESTINATION_PATH, self.provider.inventory_name, inventory)
+        finally:
+            await self.call(self.provider.disconnect)
+
+
+    async def transfer(self, semaphore, DESTINATION_PATH, relative_path, remote_files, digests):
+        """
+        Check if a local file has to be uploaded (digests are computed in the worker threads too) & upload it.
+        """
+        key = self.provider.get_remote_key(relative_path)
+        async with semaphore:
+            offset = await self.call(self.provider.get_upload_offset, DESTINATION_PATH, relative_path, remote_files.get(key), digests)
+            if offset is None:
+                return
+            remote_files[key] = await self.call(self.provider.upload_file, DESTINATION_PATH, relative_path, remote_files.get(key), offset)
+        self.uploaded_files += 1
+        self.uploaded_bytes += os.path.getsize(os.path.join(DESTINATION_PATH, relative_path)) - offset
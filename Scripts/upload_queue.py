@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file keeps a durable queue of uploads to the storage provider (.upload_queue.json in the destination path).
+A backup only adds jobs to the queue & finishes as soon as its archive is written, a background worker uploads:
+    * File jobs: a single backup file (e.g. a finished backup volume).
+    * Sync jobs: sync the whole destination path with the storage provider.
+A job leaves the queue only once it succeeded (a file job once the whole file was uploaded): failed jobs,
+e.g. storage provider full or not configured, are retried with exponential backoff,
+& the jobs left by a previous run (closed program, crash...) are picked up when the worker starts again.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+
+QUEUE_FILENAME = ".upload_queue.json"
+RETRY_BASE_DELAY = 30  # Seconds before the first retry, doubled after every failed attempt
+MAX_RETRY_DELAY = 60 * 60
+
+
+class IncompleteUploadError(Exception):
+    """
+    A file job uploaded less than the whole file.
+    """
+
+
+def get_retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+class UploadQueue:
+    """
+    Durable upload queue & its background worker.
+    upload(job) performs a job & returns the number of bytes it uploaded (for a file job: the size of the uploaded file),
+    it raises an exception if the job failed.
+    """
+
+    def __init__(self, DESTINATION_PATH, upload):
+        self.DESTINATION_PATH = DESTINATION_PATH
+        self.queue_path = os.path.join(DESTINATION_PATH, QUEUE_FILENAME)
+        self.upload = upload
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.running_job = None
+        self.stop_when_idle = False
+        self.state = self.load()
+
+
+    def load(self):
+        """
+        Load the queue from the destination path.
+        Return an empty queue if it doesn't exist or can't be read.
+        """
+        try:
+            with open(self.queue_path, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"jobs": [], "uploaded_bytes": 0, "upload_seconds": 0.0}
+
+
+    def save(self):
+        with open(f"{self.queue_path}.tmp", 'w') as file:
+            json.dump(self.state, file)
+        os.replace(f"{self.queue_path}.tmp", self.queue_path)  # Don't leave a half written queue behind
+
+
+    def put(self, provider, job_type="sync", filename=None):
+        """
+        Add a job to the queue & wake the worker up.
+        A job that is already queued (same provider, type & file) is not added twice, it's retried right away instead
+        (unless it's running: it may have started before the new backup was written).
+        """
+        with self.lock:
+            for job in self.state['jobs']:
+                if (job['provider'], job['type'], job['filename']) == (provider, job_type, filename) and job is not self.running_job:
+                    job['next_attempt'] = time.time()
+                    break
+            else:
+                self.state['jobs'].append({
+                    "id": uuid.uuid4().hex, "provider": provider, "type": job_type, "filename": filename,
+                    "added": time.time(), "attempts": 0, "next_attempt": time.time(), "last_error": None
+                })
+            self.save()
+        self.wakeup.set()
+
+
+    def start(self):
+        """
+        Start the background worker (if it isn't running already).
+        """
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_when_idle = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def wait_until_idle(self):
+        """
+        Wait for the jobs that are due now. Jobs waiting for a retry stay in the queue for the next run.
+        """
+        self.stop_when_idle = True
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+
+
+    def run(self):
+        while True:
+            job, delay = self.get_next_job()
+            if job is None:
+                if self.stop_when_idle:
+                    break
+                self.wakeup.wait(delay)
+                self.wakeup.clear()
+                continue
+
+            start = time.time()
+            try:
+                uploaded_bytes = self.upload(job)
+                self.check_upload(job, uploaded_bytes)
+            except (Exception, SystemExit) as e:  # Providers exit on missing credentials, keep the worker alive
+                self.retry_later(job, e)
+            else:
+                self.complete(job, uploaded_bytes, start)
+
+
+    def check_upload(self, job, uploaded_bytes):
+        """
+        Raise IncompleteUploadError if a file job didn't upload the whole file, so it's retried instead of completed.
+        """
+        if job['type'] != "file":
+            return
+        try:
+            file_size = os.path.getsize(os.path.join(self.DESTINATION_PATH, job['filename']))
+        except FileNotFoundError:  # Removed since it was queued (e.g. expired)
+            return
+        if (uploaded_bytes or 0) < file_size:
+            raise IncompleteUploadError(f"{uploaded_bytes or 0} of {file_size} bytes of {job['filename']} were uploaded.")
+
+
+    def get_next_job(self):
+        """
+        Return the oldest job that is due (or None) & how long to wait for the next one.
+        """
+        with self.lock:
+            now = time.time()
+            due_jobs = [job for job in self.state['jobs'] if job['next_attempt'] <= now]
+            if due_jobs:
+                self.running_job = due_jobs[0]
+                return self.running_job, 0
+            next_attempts = [job['next_attempt'] for job in self.state['jobs']]
+            return None, min(next_attempts) - now if next_attempts else None
+
+
+    def complete(self, job, uploaded_bytes, start):
+        """
+        Remove a finished job from the queue & add it to the throughput.
+        A sync also uploaded the files of the file jobs of its provider queued before it started, so they are removed too.
+        """
+        with self.lock:
+            self.state['jobs'] = [queued_job for queued_job in self.state['jobs'] if queued_job['id'] != job['id'] and
+                                  not (job['type'] == "sync" and queued_job['type'] == "file" and
+                                       queued_job['provider'] == job['provider'] and queued_job['added'] < start)]
+            self.state['uploaded_bytes'] += uploaded_bytes or 0
+            self.state['upload_seconds'] += time.time() - start
+            self.running_job = None
+            self.save()
+
+
+    def retry_later(self, job, error):
+        with self.lock:
+            job['attempts'] += 1
+            job['next_attempt'] = time.time() + get_retry_delay(job['attempts'])
+            job['last_error'] = str(error) or type(error).__name__
+            self.running_job = None
+            self.save()
+
+
+    def get_queue_depth(self):
+        with self.lock:
+            return len(self.state['jobs'])
+
+
+    def get_throughput(self):
+        """
+        Return the average upload throughput (bytes per second) of the finished jobs.
+        """
+        with self.lock:
+            if not self.state['upload_seconds']:
+                return 0
+            return self.state['uploaded_bytes'] / self.state['upload_seconds']
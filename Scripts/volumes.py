@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file reads backups split into fixed-size volumes (YYYY-MM-DD.zip.001, YYYY-MM-DD.zip.002...),
+the volumes are written by zip_utils.VolumeFile & queued for upload as soon as each one is finished.
+A split backup is opened like a single zip file, its volumes are read as one continuous file.
+"""
+
+import os
+import pyzipper
+
+
+def get_volume_path(file_name, number):
+    return f"{file_name}.{number:03d}"
+
+
+def get_volume_paths(file_name):
+    """
+    Return the volumes of a split backup, in order (empty list if the backup isn't split).
+    """
+    volume_paths = []
+    while os.path.exists(get_volume_path(file_name, len(volume_paths) + 1)):
+        volume_paths.append(get_volume_path(file_name, len(volume_paths) + 1))
+    return volume_paths
+
+
+def get_backup_filename(filename):
+    """
+    Return the backup a file belongs to: the zip file of a volume (YYYY-MM-DD.zip.001 -> YYYY-MM-DD.zip), or the file itself.
+    """
+    name, extension = os.path.splitext(filename)
+    return name if name.endswith('.zip') and extension[1:].isdigit() else filename
+
+
+def get_backup_files(file_name):
+    """
+    Return the files a zip backup is made of: its volumes, or the zip file itself.
+    """
+    return get_volume_paths(file_name) or [file_name]
+
+
+def backup_exists(file_name):
+    return os.path.exists(file_name) or os.path.exists(get_volume_path(file_name, 1))
+
+
+def get_backup_file_size(file_name):
+    return sum(os.path.getsize(path) for path in get_backup_files(file_name))
+
+
+def remove_backup_files(file_name):
+    """
+    Remove a zip backup (zip file or all its volumes).
+    """
+    for path in [file_name] + get_volume_paths(file_name):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def open_backup(file_name):
+    """
+    Open a zip backup (zip file or volumes) in read mode.
+    """
+    if os.path.exists(file_name):
+        return pyzipper.AESZipFile(file=file_name)
+
+    zipObj = pyzipper.AESZipFile(file=MultiVolumeFile(file_name))
+    zipObj._filePassed = 0  # Close the volumes together with the zip file
+    return zipObj
+
+
+class MultiVolumeFile:
+    """
+    Read-only, seekable file made of the volumes of a split backup.
+    """
+
+    def __init__(self, file_name):
+        self.name = file_name
+        self.volume_paths = get_volume_paths(file_name)
+        self.volume_offsets = [0]
+        for path in self.volume_paths:
+            self.volume_offsets.append(self.volume_offsets[-1] + os.path.getsize(path))
+        self.size = self.volume_offsets[-1]
+        self.position = 0
+        self.volume_index = None
+        self.volume = None
+
+
+    def seekable(self):
+        return True
+
+
+    def tell(self):
+        return self.position
+
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+
+        chunks = []
+        while size > 0 and self.position < self.size:
+            index = self.get_volume_index(self.position)
+            volume_offset = self.position - self.volume_offsets[index]
+            volume_size = self.volume_offsets[index + 1] - self.volume_offsets[index]
+            self.open_volume(index).seek(volume_offset)
+            chunk = self.volume.read(min(size, volume_size - volume_offset))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+
+    def get_volume_index(self, position):
+        index = 0
+        while position >= self.volume_offsets[index + 1]:
+            index += 1
+        return index
+
+
+    def open_volume(self, index):
+        """
+        Return the open volume file (one volume is open at a time).
+        """
+        if index != self.volume_index:
+            self.close()
+            self.volume = open(self.volume_paths[index], 'rb')
+            self.volume_index = index
+        return self.volume
+
+
+    def close(self):
+        if self.volume:
+            self.volume.close()
+            self.volume, self.volume_index = None, None
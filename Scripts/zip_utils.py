@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file provides a streaming pipeline for writing zip files (backups):
+    * Reader stage: a thread reads source files (sequential I/O on the source drive).
+    * Compressor stage: worker threads compress many entries at once (zlib, bz2 & lzma release the GIL).
+    * Writer stage: a thread appends the finished entries to the zip file in order.
+The stages are joined by bounded queues & the buffered file data is capped (pipeline_memory_limit),
+so a slow destination drive doesn't stall source reads (and the other way round) & peak memory stays predictable.
+With adaptive compression, incompressible files are stored instead of being compressed (see compression_policy.py).
+A structural check only reads the central directory of the zip file: it doesn't check the compressed data against the CRC-32.
+A deep check reads the file back twice: its SHA-256 is compared with the one computed while writing (for deep checks only),
+then every entry's CRC-32 is tested.
+The zip file can be split into fixed-size volumes (VolumeFile), each finished volume is handed over
+(e.g. for upload) while the next one is written.
+"""
+
+import io
+import os
+import time
+import zlib
+import stat
+import queue
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pyzipper import BadZipFile
+from pyzipper.zipfile import _get_compressor
+from .compression_policy import get_entry_compression_method
+from .zstd_utils import ZIP_ZSTANDARD, get_zstd_compressor
+from .volumes import get_volume_path, get_backup_files, get_backup_file_size, remove_backup_files, open_backup
+from .digests import DIGEST_HASHERS, record_file_digests
+
+MAX_PARALLEL_FILE_SIZE = 32 * 1024 * 1024  # Bigger files are streamed block by block through the writer
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def get_zipinfo(zipinfo_cls, path, stat_result):
+    """
+    Build the zip entry info of a file or folder from its cached stat result (same as ZipInfo.from_file, without stat'ing again).
+    """
+    arcname = os.path.normpath(os.path.splitdrive(path)[1])
+    while arcname[0] in (os.sep, os.altsep):
+        arcname = arcname[1:]
+    is_dir = stat.S_ISDIR(stat_result.st_mode)
+    if is_dir:
+        arcname += '/'
+
+    zinfo = zipinfo_cls(arcname, time.localtime(stat_result.st_mtime)[0:6])
+    zinfo.external_attr = (stat_result.st_mode & 0xFFFF) << 16  # Unix attributes
+    if is_dir:
+        zinfo.file_size = 0
+        zinfo.external_attr |= 0x10  # MS-DOS directory flag
+    else:
+        zinfo.file_size = stat_result.st_size
+    return zinfo
+
+
+def compress_data(data, compress_type, compresslevel):
+    """
+    Compress file data.
+    Return the compressed data, the CRC-32 & the size of the original data.
+    """
+    if compress_type == ZIP_ZSTANDARD:
+        compressor = get_zstd_compressor(compresslevel)  # Single-threaded, entries are already compressed in parallel
+    else:
+        compressor = _get_compressor(compress_type, compresslevel)
+    compressed_data = compressor.compress(data) + compressor.flush() if compressor else data
+    return compressed_data, zlib.crc32(data), len(data)
+
+
+def get_file_digest(file_name):
+    """
+    Return the SHA-256 of a zip file or of its volumes one after the other (read back from disk).
+    """
+    file_hash = hashlib.sha256()
+    for path in get_backup_files(file_name):
+        with open(path, 'rb') as file:
+            while True:
+                data = file.read(BLOCK_SIZE)
+                if not data:
+                    break
+                file_hash.update(data)
+    return file_hash.hexdigest()
+
+
+def verify_zip_file(file_name, archive_file, entries, password=None, deep=False):
+    """
+    Check a zip file written through a HashingFile (or VolumeFile):
+        * Structural: the file has the size that was written & its central directory lists the written entries (names, CRC-32 & sizes).
+          The entry data isn't read, so it doesn't detect corrupted data (e.g. a bad sector), only a truncated or malformed zip file.
+        * Deep: also read the file back, compare its SHA-256 with the one computed while writing (archive_file opened with sha256)
+          & test every entry's CRC-32, that's two reads of the file.
+    """
+    try:
+        if get_backup_file_size(file_name) != archive_file.size:
+            return False
+
+        with open_backup(file_name) as zipObj:
+            if [get_entry_record(zinfo) for zinfo in zipObj.infolist()] != [get_entry_record(zinfo) for zinfo in entries]:
+                return False
+            if deep:
+                if get_file_digest(file_name) != archive_file.hexdigest():
+                    return False
+                zipObj.setpassword(password)
+                return zipObj.testzip() is None
+        return True
+    except (BadZipFile, RuntimeError, OSError):
+        return False
+
+
+def get_entry_record(zinfo):
+    return zinfo.filename, zinfo.CRC, zinfo.file_size, zinfo.compress_size
+
+
+class HashingFile:
+    """
+    Write-only zip file output that hashes the bytes as they are written.
+    It isn't seekable, so zipfile writes every entry once (sizes & CRC-32 go in data descriptors
+    instead of rewriting the local headers) & the hash covers the whole zip file.
+    The SHA-256 is only computed with sha256 (verify_mode Deep, it's compared with the file read back).
+    The digests compared with the storage provider's files (digest_algorithms: md5, content_hash) are computed too
+    & recorded once the file is complete, so the sync to the cloud doesn't read it back.
+    """
+
+    def __init__(self, file_name, digest_algorithms=(), sha256=False):
+        remove_backup_files(file_name)  # Replace a backup of the same name (zip file or volumes)
+        self.name = file_name
+        self.file = open(file_name, 'wb')
+        self.hash = hashlib.sha256() if sha256 else None
+        self.size = 0
+        self.digest_algorithms = digest_algorithms
+        self.file_digests = self.get_digest_hashers()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if exc_type is None:
+            self.record_digests()
+
+
+    def write(self, data):
+        if self.hash:
+            self.hash.update(data)
+        self.size += len(data)
+        for file_digest in self.file_digests.values():
+            file_digest.update(data)
+        return self.file.write(data)
+
+
+    def get_digest_hashers(self):
+        return {algorithm: DIGEST_HASHERS[algorithm]() for algorithm in self.digest_algorithms}
+
+
+    def record_digests(self):
+        """
+        Record the digests of the file that was just closed.
+        """
+        if self.file_digests:
+            record_file_digests(self.file.name, {algorithm: file_digest.hexdigest() for algorithm, file_digest in self.file_digests.items()})
+
+
+    def tell(self):
+        return self.size
+
+
+    def seek(self, offset, whence=0):
+        raise io.UnsupportedOperation("zip file output is not seekable")
+
+
+    def flush(self):
+        self.file.flush()
+
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+class VolumeFile(HashingFile):
+    """
+    Zip file output split into volumes of volume_size bytes (file_name.001, file_name.002...).
+    on_volume is called with the path of every finished volume (its digests are recorded), while the next one is written.
+    """
+
+    def __init__(self, file_name, volume_size, on_volume, digest_algorithms=(), sha256=False):
+        remove_backup_files(file_name)
+        self.name = file_name
+        self.hash = hashlib.sha256() if sha256 else None
+        self.size = 0
+        self.digest_algorithms = digest_algorithms
+        self.file_digests = self.get_digest_hashers()
+        self.volume_size = volume_size
+        self.on_volume = on_volume
+        self.volume_number = 1
+        self.volume_written = 0
+        self.file = open(get_volume_path(file_name, self.volume_number), 'wb')
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if exc_type is not None:
+            return
+        if self.volume_written or self.volume_number == 1:
+            self.record_digests()
+            self.on_volume(self.file.name)
+        else:
+            os.remove(self.file.name)  # The last volume was filled exactly, the next one stayed empty
+
+
+    def write(self, data):
+        if self.hash:
+            self.hash.update(data)
+        self.size += len(data)
+        size = len(data)
+        data = memoryview(data)
+        while data:
+            part = data[:self.volume_size - self.volume_written]
+            for file_digest in self.file_digests.values():
+                file_digest.update(part)
+            self.file.write(part)
+            self.volume_written += len(part)
+            data = data[len(part):]
+            if self.volume_written == self.volume_size:
+                self.next_volume()
+        return size
+
+
+    def next_volume(self):
+        self.file.close()
+        self.record_digests()
+        self.on_volume(self.file.name)
+        self.file_digests = self.get_digest_hashers()
+        self.volume_number += 1
+        self.volume_written = 0
+        self.file = open(get_volume_path(self.name, self.volume_number), 'wb')
+
+
+class MemoryBudget:
+    """
+    Limit the amount of file data buffered between the pipeline stages.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+
+    def acquire(self, size):
+        """
+        Wait until there is room for size bytes (a single oversized entry is let through when the pipeline is empty).
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+
+    def release(self, size):
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+
+class ParallelZipWriter:
+    """
+    Read, compress & write files to an open zip file as a pipeline of concurrent stages.
+    The compressor workers can be shared between backups (executor), they are only shut down if the writer created them.
+    """
+
+    def __init__(self, zipObj, workers, memory_limit, adaptive_compression=False, executor=None):
+        self.zipObj = zipObj
+        self.adaptive_compression = adaptive_compression
+        self.workers = max(int(workers), 1)
+        self.budget = MemoryBudget(int(memory_limit) * 1024 * 1024)
+        self.owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=self.workers)
+        self.paths = queue.Queue(maxsize=1024)  # Scanner -> reader
+        self.entries = queue.Queue(maxsize=self.workers * 4)  # Reader -> writer (in archive order)
+        self.error = None
+        self.reader = threading.Thread(target=self.read_files, daemon=True)
+        self.writer = threading.Thread(target=self.write_entries, daemon=True)
+        self.reader.start()
+        self.writer.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self.error is None:
+            self.error = exc_value  # Stop the stages, they only drain their queues from now on
+        self.paths.put(None)
+        self.reader.join()
+        self.writer.join()
+        if self.owns_executor:
+            self.executor.shutdown(cancel_futures=True)
+        if exc_type is None and self.error is not None:
+            raise self.error
+
+
+    def write(self, path, stat_result):
+        """
+        Queue a file or folder (with its cached stat result) to be added to the zip file.
+        """
+        if self.error is not None:
+            raise self.error
+        self.paths.put(("path", path, stat_result))
+
+
+    def writestr(self, arcname, data):
+        """
+        Queue a string to be added to the zip file under the name arcname.
+        """
+        if self.error is not None:
+            raise self.error
+        self.paths.put(("data", arcname, data))
+
+
+    def read_files(self):
+        """
+        Reader stage: read source files & hand them to the compressor workers (or stream them to the writer).
+        """
+        while True:
+            item = self.paths.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue  # Drain the queue so the scanner never blocks
+
+            try:
+                if item[0] == "data":
+                    self.entries.put(item)
+                    continue
+
+                path = item[1]
+                zinfo = get_zipinfo(self.zipObj.zipinfo_cls, path, item[2])
+                if zinfo.is_dir():
+                    self.entries.put(("dir", path))
+                    continue
+
+                zinfo.compress_type = self.zipObj.compression
+                zinfo._compresslevel = self.zipObj.compresslevel
+                if zinfo.file_size > MAX_PARALLEL_FILE_SIZE:
+                    self.read_blocks(path, zinfo)
+                else:
+                    self.read_file(path, zinfo)
+            except Exception as e:
+                self.error = e
+        self.entries.put(None)
+
+
+    def read_file(self, path, zinfo):
+        """
+        Read a file & submit it to the compressor workers.
+        """
+        size = zinfo.file_size
+        self.budget.acquire(size)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            self.budget.release(size)
+            raise
+
+        self.set_entry_compression_method(path, zinfo, data)
+        future = self.executor.submit(compress_data, data, zinfo.compress_type, zinfo._compresslevel)
+        self.entries.put(("compressed", zinfo, future, size))
+
+
+    def read_blocks(self, path, zinfo):
+        """
+        Stream a big file to the writer block by block.
+        """
+        blocks = queue.Queue()
+        with open(path, 'rb') as file:
+            block = self.read_block(file)
+            self.set_entry_compression_method(path, zinfo, block)
+            self.entries.put(("streamed", zinfo, blocks))
+            try:
+                while block and self.error is None:
+                    blocks.put(block)
+                    block = self.read_block(file)
+            finally:
+                blocks.put(None)
+
+
+    def read_block(self, file):
+        """
+        Read the next block of a big file (within the memory budget).
+        """
+        self.budget.acquire(BLOCK_SIZE)
+        try:
+            block = file.read(BLOCK_SIZE)
+        except OSError:
+            self.budget.release(BLOCK_SIZE)
+            raise
+        self.budget.release(BLOCK_SIZE - len(block))
+        return block
+
+
+    def set_entry_compression_method(self, path, zinfo, sample):
+        """
+        Store incompressible files instead of compressing them (adaptive compression).
+        """
+        if self.adaptive_compression:
+            zinfo.compress_type = get_entry_compression_method(path, sample, zinfo.compress_type)
+
+
+    def write_entries(self):
+        """
+        Writer stage: append the entries to the zip file in the order they were queued.
+        """
+        while True:
+            entry = self.entries.get()
+            if entry is None:
+                break
+
+            try:
+                if self.error is not None:
+                    self.discard_entry(entry)
+                elif entry[0] == "dir":
+                    self.zipObj.write(entry[1])
+                elif entry[0] == "data":
+                    self.zipObj.writestr(entry[1], entry[2])
+                elif entry[0] == "compressed":
+                    self.write_compressed_entry(*entry[1:])
+                else:
+                    self.write_streamed_entry(*entry[1:])
+            except Exception as e:
+                self.error = e
+                self.discard_entry(entry)
+
+
+    def write_compressed_entry(self, zinfo, future, size):
+        """
+        Append an entry that was already compressed by a worker (encryption is still applied by the writer).
+        """
+        compressed_data, crc, file_size = future.result()
+        zinfo.file_size = file_size
+        with self.zipObj.open(zinfo, 'w') as dest:
+            dest._compressor = None  # Skip compression, data is already compressed
+            dest.write(compressed_data)
+            dest._crc = crc
+            dest._file_size = file_size
+        self.budget.release(size)
+
+
+    def write_streamed_entry(self, zinfo, blocks):
+        """
+        Compress & append a big file while the reader is still reading it.
+        """
+        with self.zipObj.open(zinfo, 'w') as dest:
+            while True:
+                block = blocks.get()
+                if block is None:
+                    break
+                try:
+                    dest.write(block)
+                finally:
+                    self.budget.release(len(block))
+
+
+    def discard_entry(self, entry):
+        """
+        Release the memory held by an entry that won't be written (after an error).
+        """
+        if entry[0] == "compressed":
+            self.budget.release(entry[3])
+        elif entry[0] == "streamed":
+            while True:
+                block = entry[2].get()
+                if block is None:
+                    break
+                self.budget.release(len(block))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+This file adds the Zstandard compression method (ZIP method 93) to pyzipper.
+It supports multi-threaded compression & long-distance matching,
+and works with AES encryption & restores like the built-in compression methods.
+"""
+
+import zstandard
+from pyzipper import zipfile as pyzipper_zipfile
+from pyzipper.zipfile_aes import AESZipExtFile
+from .configs import config
+
+ZIP_ZSTANDARD = 93
+
+
+def get_zstd_compressor(compresslevel, threads=0):
+    """
+    Return a Zstandard compressor (compress/flush interface, like zlib).
+    """
+    compression_params = zstandard.ZstdCompressionParameters.from_level(
+        int(compresslevel or 3),
+        threads=threads,
+        enable_ldm=bool(config['zstd_long_distance_matching'])
+    )
+    return zstandard.ZstdCompressor(compression_params=compression_params).compressobj()
+
+
+def register_zstandard():
+    """
+    Teach pyzipper to compress & decompress ZIP_ZSTANDARD entries (once, later calls do nothing).
+    """
+    if ZIP_ZSTANDARD in pyzipper_zipfile.compressor_names:
+        return
+    check_compression = pyzipper_zipfile._check_compression
+    get_compressor = pyzipper_zipfile._get_compressor
+    get_decompressor = pyzipper_zipfile.ZipExtFile.get_decompressor
+    check_wz_aes = AESZipExtFile.check_wz_aes
+
+    def _check_compression(compression):
+        if compression != ZIP_ZSTANDARD:
+            check_compression(compression)
+
+    def _get_compressor(compress_type, compresslevel=None):
+        if compress_type == ZIP_ZSTANDARD:
+            # Streamed (big) entries use zstd worker threads
+            workers = int(config['compression_workers'])
+            return get_zstd_compressor(compresslevel, threads=workers if workers > 1 else 0)
+        return get_compressor(compress_type, compresslevel)
+
+    def _get_decompressor(self, compress_type):
+        if compress_type == ZIP_ZSTANDARD:
+            return zstandard.ZstdDecompressor(max_window_size=2**31).decompressobj()
+        return get_decompressor(self, compress_type)
+
+    def _check_wz_aes(self):
+        if self._zinfo.compress_type == ZIP_ZSTANDARD:
+            # The end of the frame may come after the last decompressed byte,
+            # read it so the HMAC is computed over the whole compressed stream.
+            while self._compress_left > 0:
+                self._read2(self.MIN_READ_SIZE)
+        check_wz_aes(self)
+
+    pyzipper_zipfile.compressor_names[ZIP_ZSTANDARD] = 'zstandard'
+    pyzipper_zipfile._check_compression = _check_compression
+    pyzipper_zipfile._get_compressor = _get_compressor
+    pyzipper_zipfile.ZipExtFile.get_decompressor = _get_decompressor
+    AESZipExtFile.check_wz_aes = _check_wz_aes
+
+
+register_zstandard()
@@ -16,6 +16,7 @@ from Scripts.CLI.backup_utils import Backup
 from Scripts.CLI.restore import RestoreBackup
 from Scripts.file_utils import (
     get_backup_size,
+    start_backup_size_reconcile,
     storage_media_free_space,
     last_backup,
     create_destination_directory_path,
@@ -58,13 +59,17 @@ print("-------------------------")
 print(f"\n~ Last Backup: {B.LIGHTBLUE_EX}{F.WHITE} {last_backup(DESTINATION_PATH)} {B.RESET}{F.RESET}")
 print(f"~ Free space on ({DESTINATION_PATH.replace('SafeArchive/', '')}): {storage_media_free_space()} GB")
 print(f"~ Size of backup: {humanize.naturalsize(get_backup_size(DESTINATION_PATH))}")
+start_backup_size_reconcile(DESTINATION_PATH)  # Correct the size ledger in the background
+upload_queue = backup.start_upload_queue(DESTINATION_PATH)  # Resume the uploads left by a previous run
+print(f"~ Upload queue: {upload_queue.get_queue_depth()} pending ({humanize.naturalsize(upload_queue.get_throughput())}/s)")
 print("\nMenu Options:")
 print(f"  |- 1) Config {F.LIGHTWHITE_EX}Info{F.RESET} - Display your {F.LIGHTBLUE_EX}preferences{F.RESET}")
 print(f"  |- 2) {F.LIGHTMAGENTA_EX}Backup{F.RESET} Now - Zip source path files to {F.LIGHTCYAN_EX}destination{F.RESET} path")
 print(f"  |- 3) Restore {F.LIGHTGREEN_EX}past{F.RESET} backup - {F.LIGHTBLACK_EX}Extract{F.RESET} selected zip file")
+print(f"  |- 4) {F.LIGHTBLUE_EX}Search{F.RESET} backups - Find which backups {F.LIGHTYELLOW_EX}contain{F.RESET} a file")
 
 try:
-    choice = int(input("\nChoice (1-3): "))
+    choice = int(input("\nChoice (1-4): "))
 except ValueError:
     notify_user(message="Undefined choice.", terminal_color=F.LIGHTRED_EX)
     sys.exit()
@@ -80,7 +85,14 @@ elif choice == 2:
     except KeyboardInterrupt:
         notify_user(message="Backup process cancelled.", terminal_color=F.LIGHTRED_EX)
         sys.exit()
+    try:
+        backup.wait_for_uploads()
+    except KeyboardInterrupt:
+        notify_user(message="Upload paused, it will resume on the next run.", terminal_color=F.LIGHTCYAN_EX)
+        sys.exit()
 elif choice == 3:
     restore_backup.run_restore_thread(DESTINATION_PATH)
+elif choice == 4:
+    restore_backup.search_file(DESTINATION_PATH)
 else:
     notify_user(message="Undefined choice.", terminal_color=F.LIGHTRED_EX)
@@ -14,7 +14,7 @@ import runpy
 import tkinter as tk
 
 # Import module files
-from Scripts.file_utils import get_backup_size, storage_media_free_space, last_backup, create_destination_directory_path
+from Scripts.file_utils import get_backup_size, start_backup_size_reconcile, storage_media_free_space, last_backup, create_destination_directory_path
 from Scripts.GUI.file_utils import get_available_drives, update_listbox, remove_item, add_item
 from Scripts.GUI.widgets import Combobox
 from Scripts.GUI.backup_utils import Backup
@@ -72,6 +72,12 @@ class App(ctk.CTk):
         size_of_backup_label = ctk.CTkLabel(
             master=self, text=f"Size of backup: {humanize.naturalsize(get_backup_size(DESTINATION_PATH))}", font=('Helvetica', 12))
         size_of_backup_label.place(x=15, y=70)
+        start_backup_size_reconcile(DESTINATION_PATH)  # Correct the size ledger in the background
+
+        self.upload_queue = backup.start_upload_queue(DESTINATION_PATH)  # Resume the uploads left by a previous run
+        self.upload_queue_label = ctk.CTkLabel(master=self, text="", font=('Helvetica', 12))
+        self.upload_queue_label.place(x=250, y=70)
+        self.update_upload_queue_label()
 
         total_drive_space_label = ctk.CTkLabel(
             master=self, text=f"Free space on ({DESTINATION_PATH.replace('SafeArchive/', '')}): {storage_media_free_space()} GB", font=('Helvetica', 12))
@@ -134,6 +140,15 @@ class App(ctk.CTk):
         self.backup_button.place(x=350, y=310)
 
 
+    def update_upload_queue_label(self):
+        """
+        Show the upload queue depth & throughput (refreshed every few seconds).
+        """
+        self.upload_queue_label.configure(
+            text=f"Upload queue: {self.upload_queue.get_queue_depth()} pending ({humanize.naturalsize(self.upload_queue.get_throughput())}/s)")
+        self.after(3000, self.update_upload_queue_label)
+
+
 if __name__ == "__main__":
     app = App()
     app.mainloop()
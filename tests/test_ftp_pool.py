@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Check the FTP upload connection pool against a local FTP server (pyftpdlib):
+connections are reused & bounded, interrupted uploads are resumed (others restart) & dropped connections are replaced.
+Run from the program directory: python -m unittest discover tests
+"""
+
+import io
+import os
+import ftplib
+import shutil
+import logging
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import FTPServer
+except ImportError:
+    FTPHandler = None
+
+from Scripts.cloud_utils import FTP
+
+
+@unittest.skipIf(FTPHandler is None, "pyftpdlib isn't installed")
+class FTPConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger('pyftpdlib').setLevel(logging.ERROR)
+        self.server_root = tempfile.mkdtemp()
+        self.local_root = tempfile.mkdtemp()
+        authorizer = DummyAuthorizer()
+        authorizer.add_user('user', 'password', self.server_root, perm='elradfmwMT')
+
+        self.logins = []
+        logins = self.logins
+        class Handler(FTPHandler):
+            def on_login(self, username):
+                logins.append(self)
+        Handler.authorizer = authorizer
+
+        self.server = FTPServer(('127.0.0.1', 0), Handler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever, kwargs={'timeout': 0.1}, daemon=True)
+        self.server_thread.start()
+
+        port_patch = mock.patch.object(ftplib.FTP, 'port', self.server.address[1])  # Default port of new connections
+        port_patch.start()
+        self.addCleanup(port_patch.stop)
+
+        self.ftp = FTP()
+        self.ftp.hostname = '127.0.0.1'
+        self.ftp.username = 'user'
+        self.ftp.password = 'password'
+        self.ftp.connection_slots = threading.BoundedSemaphore(2)
+
+
+    def tearDown(self):
+        self.ftp.disconnect()
+        self.server.close_all()
+        self.server_thread.join()
+        shutil.rmtree(self.server_root)
+        shutil.rmtree(self.local_root)
+
+
+    def write_local_file(self, relative_path, data):
+        path = os.path.join(self.local_root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+
+
+    def read_remote_file(self, relative_path):
+        with open(os.path.join(self.server_root, 'SafeArchive', relative_path), 'rb') as file:
+            return file.read()
+
+
+    def test_connections_are_reused(self):
+        for index in range(5):
+            self.write_local_file(f"chunks/{index:02x}/chunk", bytes([index]) * 1000)
+            remote_file = self.ftp.upload_file(self.local_root, f"chunks/{index:02x}/chunk", None, 0)
+            self.assertEqual(remote_file['size'], 1000)
+            self.assertEqual(self.read_remote_file(f"chunks/{index:02x}/chunk"), bytes([index]) * 1000)
+        self.assertEqual(len(self.logins), 1)
+
+
+    def test_connections_are_bounded(self):
+        files = [f"backup_{index}.zip" for index in range(8)]
+        for file in files:
+            self.write_local_file(file, os.urandom(256 * 1024))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda file: self.ftp.upload_file(self.local_root, file, None, 0), files))
+        for file in files:
+            with open(os.path.join(self.local_root, file), 'rb') as local_file:
+                self.assertEqual(self.read_remote_file(file), local_file.read())
+        self.assertLessEqual(len(self.logins), 2)
+
+
+    def test_interrupted_upload_is_resumed(self):
+        data = os.urandom(300 * 1024)
+        self.write_local_file("backup.zip", data)
+
+        class DroppedFile(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell() >= 100 * 1024:
+                    raise OSError("connection dropped")
+                return super().read(min(size, 100 * 1024 - self.tell()))
+        with mock.patch('builtins.open', lambda path, mode='r', *args, **kwargs: DroppedFile(data) if path.endswith("backup.zip") and mode == 'rb' else io.open(path, mode, *args, **kwargs)):
+            with self.assertRaises(OSError):
+                self.ftp.upload_file(self.local_root, "backup.zip", None, 0)
+
+        time.sleep(0.5)  # Let the server write what it received before the connection dropped
+        self.ftp.connect()
+        remote_file = self.ftp.list_remote_files()["backup.zip"]
+        self.assertLessEqual(remote_file['size'], 100 * 1024)
+        offset = self.ftp.get_upload_offset(self.local_root, "backup.zip", remote_file, None)
+        self.assertEqual(offset, remote_file['size'])
+        self.assertEqual(self.ftp.upload_file(self.local_root, "backup.zip", remote_file, offset)['size'], len(data))
+        self.assertEqual(self.read_remote_file("backup.zip"), data)
+
+
+    def test_unrecorded_smaller_file_is_uploaded_again(self):
+        data = os.urandom(300 * 1024)
+        self.write_local_file("backup.zip", data)
+        os.makedirs(os.path.join(self.server_root, 'SafeArchive'))
+        with open(os.path.join(self.server_root, 'SafeArchive', 'backup.zip'), 'wb') as remote_file:
+            remote_file.write(os.urandom(100 * 1024))  # Another file, newer on the server clock
+
+        remote_file = {"size": 100 * 1024, "modify": "99991231235959"}
+        offset = self.ftp.get_upload_offset(self.local_root, "backup.zip", remote_file, None)
+        self.assertEqual(offset, 0)
+        self.ftp.upload_file(self.local_root, "backup.zip", remote_file, offset)
+        self.assertEqual(self.read_remote_file("backup.zip"), data)
+
+
+    def test_dropped_connection_is_replaced(self):
+        self.write_local_file("first.zip", b"first")
+        self.write_local_file("second.zip", b"second")
+        self.ftp.upload_file(self.local_root, "first.zip", None, 0)
+        self.logins[0].close()  # The server closes the idle connection (e.g. timeout)
+
+        self.ftp.upload_file(self.local_root, "second.zip", None, 0)
+        self.assertEqual(self.read_remote_file("second.zip"), b"second")
+        self.assertEqual(len(self.logins), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()